@@ -3,8 +3,18 @@ from fastapi import APIRouter, File, UploadFile, HTTPException, Query
 from typing import List
 
 from app.services.receipt_service import ReceiptService
-from app.models.receipt import ReceiptListResponse, ReceiptResponse, UploadResponse
+from app.models.receipt import (
+    ReceiptListResponse, ReceiptResponse, UploadResponse, BatchUploadResponse,
+    SignedUploadRequest, SignedUploadResponse, FinalizeUploadRequest, ReceiptStatus,
+    ProcessingLane
+)
 from app.core.database import is_firebase_initialized
+from app.core.circuit_breaker import circuit_stats, gemini_breaker, storage_breaker, firestore_breaker
+from app.core.adaptive_limit import limiter_stats
+from app.services.image_cache import image_cache
+from app.services.extraction_cache import extraction_cache
+from app.services.job_queue import processing_queue
+from app.services.ai_service import ai_service
 
 # Health Router
 health_router = APIRouter()
@@ -15,6 +25,13 @@ async def health_check():
     return {
         "status": "healthy",
         "firebase_initialized": is_firebase_initialized(),
+        "image_cache": image_cache.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "processing_queue": processing_queue.stats(),
+        "circuits": circuit_stats(),
+        "concurrency_limits": limiter_stats(),
+        "ai_models": ai_service.stats(),
+        "ai_batching": ai_service.batcher.stats(),
         "timestamp": "2025-07-18T10:30:00Z"
     }
 
@@ -22,7 +39,10 @@ async def health_check():
 receipt_router = APIRouter()
 
 @receipt_router.post("/upload-receipt", response_model=UploadResponse)
-async def upload_receipt(file: UploadFile = File(...)):
+async def upload_receipt(
+    file: UploadFile = File(...),
+    auto_process: bool = Query(False, description="Extract receipt data right after upload")
+):
     """
     Upload receipt image/video to Firebase Storage and save metadata
     
@@ -30,8 +50,33 @@ async def upload_receipt(file: UploadFile = File(...)):
         - receipt_id: Unique identifier for the receipt
         - download_url: URL to access the uploaded file
         - metadata: File information
+        - extracted_data: AI extraction result when auto_process is set
     """
-    return await ReceiptService.upload_receipt(file)
+    return await ReceiptService.upload_receipt(file, auto_process=auto_process)
+
+@receipt_router.post("/upload-receipts", response_model=BatchUploadResponse)
+async def upload_receipts(files: List[UploadFile] = File(...)):
+    """
+    Upload multiple receipt images/videos in one request
+    
+    Returns per-file results; a failed file does not fail the whole batch.
+    """
+    return await ReceiptService.upload_receipts(files)
+
+@receipt_router.post("/upload-url", response_model=SignedUploadResponse)
+async def create_upload_url(request: SignedUploadRequest):
+    """
+    Get a short-lived signed URL to PUT a file directly to Firebase Storage
+    
+    The client must send the returned headers with the PUT request and then
+    call /upload-url/finalize to create the receipt.
+    """
+    return await ReceiptService.create_signed_upload(request)
+
+@receipt_router.post("/upload-url/finalize", response_model=UploadResponse)
+async def finalize_upload(request: FinalizeUploadRequest):
+    """Verify a direct upload's size and type and create the receipt record"""
+    return await ReceiptService.finalize_signed_upload(request)
 
 @receipt_router.get("/receipts", response_model=ReceiptListResponse)
 async def get_receipts(
@@ -62,11 +107,25 @@ async def get_receipt(receipt_id: str):
     return receipt
 
 # Step 2: AI Processing Routes
-@receipt_router.post("/receipts/{receipt_id}/process")
-async def process_receipt(receipt_id: str):
-    """Process receipt with Gemini Vision AI to extract structured data"""
-    from app.services.ai_service import ai_service
-    from app.models.receipt import ReceiptUpdate, ReceiptStatus
+@receipt_router.post("/receipts/{receipt_id}/process", status_code=202)
+async def process_receipt(
+    receipt_id: str,
+    bypass_cache: bool = Query(False, description="Ignore cached extraction results"),
+    priority: ProcessingLane = Query(ProcessingLane.INTERACTIVE, description="Use bulk for backfills and reprocessing")
+):
+    """
+    Queue receipt for Gemini Vision extraction
+    
+    Returns 202 with a job id right away; poll /processing-status for the result.
+    """
+    # Fail fast instead of queueing work that can't succeed right now
+    for breaker in (gemini_breaker, storage_breaker, firestore_breaker):
+        if breaker.is_open:
+            raise HTTPException(
+                status_code=503,
+                detail=f"{breaker.name} is temporarily unavailable. Please retry later.",
+                headers={"Retry-After": str(breaker.retry_after())}
+            )
     
     # Get receipt details
     receipt = await ReceiptService.get_receipt_by_id(receipt_id)
@@ -80,54 +139,26 @@ async def process_receipt(receipt_id: str):
             detail="AI service not available. Please check GEMINI_API_KEY configuration."
         )
     
-    # Update status to processing
-    update_data = ReceiptUpdate(status=ReceiptStatus.PROCESSING)
-    await ReceiptService.update_receipt(receipt_id, update_data)
+    # Concurrent requests for the same receipt share one job; the job marks it PROCESSING
+    job = await processing_queue.enqueue(receipt, use_cache=not bypass_cache, lane=priority)
+    if job is None:
+        return {
+            "success": True,
+            "message": "Receipt is already being processed by another worker",
+            "receipt_id": receipt_id,
+            "job_id": None,
+            "state": None,
+            "queue_position": None
+        }
     
-    try:
-        # Extract data using Gemini Vision
-        extracted_data = await ai_service.extract_receipt_data(receipt.download_url)
-        
-        if extracted_data:
-            # Update receipt with extracted data
-            update_data = ReceiptUpdate(
-                extracted_data=extracted_data,
-                status=ReceiptStatus.PROCESSED
-            )
-            success = await ReceiptService.update_receipt(receipt_id, update_data)
-            
-            if success:
-                return {
-                    "success": True,
-                    "message": "Receipt processed successfully",
-                    "receipt_id": receipt_id,
-                    "extracted_data": extracted_data.dict(),
-                    "confidence_score": extracted_data.confidence_score
-                }
-            else:
-                raise HTTPException(status_code=500, detail="Failed to save extracted data")
-        else:
-            # Processing failed
-            update_data = ReceiptUpdate(
-                status=ReceiptStatus.ERROR,
-                processing_error="AI extraction failed - could not extract data from image"
-            )
-            await ReceiptService.update_receipt(receipt_id, update_data)
-            
-            raise HTTPException(
-                status_code=422, 
-                detail="Failed to extract data from receipt image. Please ensure the image is clear and contains a valid receipt."
-            )
-            
-    except Exception as e:
-        # Update status to error
-        update_data = ReceiptUpdate(
-            status=ReceiptStatus.ERROR,
-            processing_error=str(e)
-        )
-        await ReceiptService.update_receipt(receipt_id, update_data)
-        
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    return {
+        "success": True,
+        "message": "Receipt queued for processing",
+        "receipt_id": receipt_id,
+        "job_id": job.job_id,
+        "state": job.state,
+        "queue_position": processing_queue.queue_position(job.job_id)
+    }
 
 @receipt_router.get("/receipts/{receipt_id}/processing-status")
 async def get_processing_status(receipt_id: str):
@@ -136,13 +167,22 @@ async def get_processing_status(receipt_id: str):
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
     
+    # Job details are only known to the worker that queued the job
+    job = processing_queue.get_latest_job(receipt_id)
+    
     return {
         "receipt_id": receipt_id,
         "status": receipt.status,
         "has_extracted_data": receipt.extracted_data is not None,
+        "extracted_data": receipt.extracted_data,
+        # Data saved while the response is still streaming
+        "partial": receipt.status == ReceiptStatus.PROCESSING and receipt.extracted_data is not None,
         "processing_error": receipt.processing_error,
         "confidence_score": receipt.extracted_data.confidence_score if receipt.extracted_data else None,
-        "updated_at": receipt.updated_at
+        "updated_at": receipt.updated_at,
+        "job_id": job.job_id if job else None,
+        "job_state": job.state if job else None,
+        "queue_position": processing_queue.queue_position(job.job_id) if job else None
     }
 
 @receipt_router.post("/receipts/{receipt_id}/generate-wallet-pass")
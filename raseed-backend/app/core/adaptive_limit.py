@@ -0,0 +1,140 @@
+# app/core/adaptive_limit.py
+from contextlib import asynccontextmanager
+from google.api_core import exceptions as google_exceptions
+import httpx
+import logging
+import time
+from typing import Any, AsyncIterator, Dict
+
+from app.core.config import settings
+from app.core.fair_share import FairSemaphore, current_lane
+
+logger = logging.getLogger(__name__)
+
+# Weight of each new sample in the baseline latency average
+BASELINE_ALPHA = 0.1
+
+# Extra seconds a call may take over the tolerated latency, so jitter on
+# millisecond calls (Firestore) doesn't count as a spike
+SPIKE_SLACK = 0.05
+
+# Successful calls of a kind needed before its latency is judged
+MIN_BASELINE_SAMPLES = 5
+
+def is_overload(error: BaseException) -> bool:
+    """Whether an error means the dependency asked us to slow down (429 / RESOURCE_EXHAUSTED)"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429
+    return isinstance(error, google_exceptions.TooManyRequests)
+
+def size_class(size: int) -> int:
+    """Payload size bucket; sizes within a bucket differ by at most 2x"""
+    return size.bit_length()
+
+class LimitedCall:
+    """One call under an AdaptiveLimiter
+
+    Its latency is only compared with earlier calls of the same kind.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    def sized(self, size: int) -> None:
+        """Compare with calls of a similar payload size only (uploads, downloads)"""
+        self.kind = f"{self.kind}:{size_class(size)}"
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one outbound dependency
+
+    Calls hold a lane-aware FairSemaphore slot. While latency stays within
+    AIMD_LATENCY_TOLERANCE x the baseline of the call's kind (a moving
+    average of successful call latencies per kind, e.g. model tier and
+    call type, or payload size class) and the limit is in use, it grows
+    by one per limit successful calls, up to the ceiling. A 429 / RESOURCE_EXHAUSTED or a
+    latency spike multiplies it by AIMD_BACKOFF, at most once per round of
+    calls: calls started before the last decrease don't decrease it again.
+    """
+
+    def __init__(self, name: str, initial: int, ceiling: int):
+        self.name = name
+        self.limit = float(initial)
+        self.ceiling = max(initial, ceiling)
+        self.semaphore = FairSemaphore(initial, settings.LANE_WEIGHTS)
+        self.baselines: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self.overloads = 0
+        self.latency_spikes = 0
+        self._decreased_at = 0.0
+
+    def _set_limit(self, limit: float) -> None:
+        self.limit = min(float(self.ceiling), max(float(settings.AIMD_MIN_LIMIT), limit))
+        self.semaphore.capacity = int(self.limit)
+        self.semaphore.wake()
+
+    def _decrease(self, started: float, reason: str) -> None:
+        if started < self._decreased_at:
+            return  # already backed off for this round of calls
+        self._decreased_at = time.monotonic()
+        self._set_limit(self.limit * settings.AIMD_BACKOFF)
+        logger.warning(f"📉 {self.name} concurrency limit lowered to {int(self.limit)} ({reason})")
+
+    def _on_success(self, kind: str, started: float, latency: float) -> None:
+        baseline = self.baselines.get(kind)
+        samples = self._samples.get(kind, 0) + 1
+        self._samples[kind] = samples
+        if baseline is None:
+            self.baselines[kind] = latency
+            return
+
+        spike = (
+            samples > MIN_BASELINE_SAMPLES
+            and latency > settings.AIMD_LATENCY_TOLERANCE * baseline + SPIKE_SLACK
+        )
+        self.baselines[kind] = baseline + BASELINE_ALPHA * (latency - baseline)
+        if spike:
+            self.latency_spikes += 1
+            self._decrease(started, f"latency {latency:.2f}s")
+        elif self.semaphore.in_use * 2 >= self.semaphore.capacity:
+            # Only grow while the limit is actually being used
+            self._set_limit(self.limit + 1.0 / self.limit)
+
+    @asynccontextmanager
+    async def guard(self, kind: str = "call") -> AsyncIterator[LimitedCall]:
+        """Hold a slot for one call of the given kind and adapt the limit to how it went"""
+        async with self.semaphore.slot(current_lane.get()):
+            call = LimitedCall(kind)
+            started = time.monotonic()
+            try:
+                yield call
+            except Exception as e:
+                if settings.ADAPTIVE_CONCURRENCY_ENABLED and is_overload(e):
+                    self.overloads += 1
+                    self._decrease(started, type(e).__name__)
+                raise
+            else:
+                if settings.ADAPTIVE_CONCURRENCY_ENABLED:
+                    self._on_success(call.kind, started, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current limit gauge and slot usage for /health"""
+        return {
+            "limit": int(self.limit),
+            "ceiling": self.ceiling,
+            "baseline_latency_ms": {kind: round(latency * 1000) for kind, latency in self.baselines.items()},
+            "overloads": self.overloads,
+            "latency_spikes": self.latency_spikes,
+            **self.semaphore.stats()
+        }
+
+# One limiter per outbound dependency
+gemini_limiter = AdaptiveLimiter("Gemini", settings.AI_MAX_CONCURRENCY, settings.AI_MAX_CONCURRENCY_CEILING)
+storage_limiter = AdaptiveLimiter("Storage", settings.STORAGE_MAX_CONCURRENCY, settings.STORAGE_MAX_CONCURRENCY_CEILING)
+firestore_limiter = AdaptiveLimiter("Firestore", settings.FIRESTORE_MAX_CONCURRENCY, settings.FIRESTORE_MAX_CONCURRENCY_CEILING)
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Gauges of every limiter"""
+    return {
+        limiter.name.lower(): limiter.stats()
+        for limiter in (gemini_limiter, storage_limiter, firestore_limiter)
+    }
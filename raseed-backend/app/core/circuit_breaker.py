@@ -0,0 +1,173 @@
+# app/core/circuit_breaker.py
+from collections import deque
+from contextlib import asynccontextmanager
+from google.api_core import exceptions as google_exceptions
+import asyncio
+import httpx
+import logging
+import math
+import requests
+import time
+from typing import Any, AsyncIterator, Deque, Dict
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors that mean the dependency itself is unhealthy, not that we sent a bad request
+DEPENDENCY_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    google_exceptions.ServerError,
+    google_exceptions.TooManyRequests,
+    httpx.TransportError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """Whether an error should count against a dependency's circuit"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(error, DEPENDENCY_ERRORS)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one outbound dependency
+
+    Tracks the outcome of the last CIRCUIT_WINDOW calls. Once at least
+    CIRCUIT_MIN_CALLS are recorded and the failure share reaches
+    CIRCUIT_FAILURE_RATE, the circuit opens and calls fail fast with
+    CircuitOpenError for CIRCUIT_OPEN_SECONDS. After that up to
+    CIRCUIT_HALF_OPEN_CALLS probe calls are let through: a success closes
+    the circuit, a failure opens it again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.times_opened = 0
+        self._outcomes: Deque[bool] = deque(maxlen=settings.CIRCUIT_WINDOW)
+        self._probes = 0
+
+    def retry_after(self) -> int:
+        """Seconds until the circuit lets a probe through"""
+        remaining = settings.CIRCUIT_OPEN_SECONDS - (time.monotonic() - self.opened_at)
+        return max(1, math.ceil(remaining))
+
+    @property
+    def is_open(self) -> bool:
+        """Whether a call made now would be rejected"""
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at < settings.CIRCUIT_OPEN_SECONDS
+        if self.state == HALF_OPEN:
+            return self._probes >= settings.CIRCUIT_HALF_OPEN_CALLS
+        return False
+
+    def _acquire(self) -> bool:
+        """Admit a call or raise CircuitOpenError; returns True for probe calls"""
+        if self.state == OPEN and not self.is_open:
+            self.state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"🔌 {self.name} circuit half-open, probing")
+
+        if self.is_open:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self.retry_after())
+
+        if self.state == HALF_OPEN:
+            self._probes += 1
+            return True
+        return False
+
+    def _trip(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._outcomes.clear()
+        logger.warning(f"🔌 {self.name} circuit opened for {settings.CIRCUIT_OPEN_SECONDS}s")
+
+    def _record(self, success: bool, probe: bool) -> None:
+        if probe:
+            self._probes = max(0, self._probes - 1)
+            if self.state != HALF_OPEN:
+                return
+            if success:
+                self.state = CLOSED
+                self._outcomes.clear()
+                logger.info(f"🔌 {self.name} circuit closed")
+            else:
+                self._trip()
+            return
+
+        if self.state != CLOSED:
+            return
+
+        self._outcomes.append(success)
+        failures = self._outcomes.count(False)
+        if (
+            len(self._outcomes) >= settings.CIRCUIT_MIN_CALLS
+            and failures / len(self._outcomes) >= settings.CIRCUIT_FAILURE_RATE
+        ):
+            self._trip()
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """Run a dependency call under the breaker
+
+        Raises CircuitOpenError without running the call while the circuit
+        is open. Only dependency failures count against the circuit; other
+        errors (bad requests, missing objects) count as successful calls.
+        """
+        probe = self._acquire()
+        try:
+            yield
+        except asyncio.CancelledError:
+            if probe:
+                self._probes = max(0, self._probes - 1)
+            raise
+        except Exception as e:
+            self._record(not is_dependency_failure(e), probe)
+            raise
+        else:
+            self._record(True, probe)
+
+    def stats(self) -> Dict[str, Any]:
+        """Breaker state for /health"""
+        calls = len(self._outcomes)
+        state = self.state
+        if state == OPEN and not self.is_open:
+            state = HALF_OPEN  # next call will probe
+        return {
+            "state": state,
+            "failure_rate": round(self._outcomes.count(False) / calls, 2) if calls else 0.0,
+            "calls_in_window": calls,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+# One breaker per outbound dependency
+gemini_breaker = CircuitBreaker("Gemini")
+storage_breaker = CircuitBreaker("Storage")
+firestore_breaker = CircuitBreaker("Firestore")
+
+def circuit_stats() -> Dict[str, Dict[str, Any]]:
+    """State of every breaker"""
+    return {
+        breaker.name.lower(): breaker.stats()
+        for breaker in (gemini_breaker, storage_breaker, firestore_breaker)
+    }
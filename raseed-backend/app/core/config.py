@@ -1,6 +1,6 @@
 # app/core/config.py
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 import os
 
 class Settings(BaseSettings):
@@ -36,18 +36,117 @@ class Settings(BaseSettings):
         "image/jpeg", "image/png", "image/gif", "image/webp",
         "video/mp4", "video/webm", "image/jpg"
     ]
+    MAX_IMAGE_PIXELS: int = 50_000_000  # checked from the image header
+    SNIFF_BYTES: int = 64 * 1024  # bytes read to detect the real file type
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB, must be a multiple of 256KB
+    MAX_FILES_PER_BATCH: int = 50
+    UPLOAD_MAX_CONCURRENCY: int = 5  # concurrent storage writes per batch
+    SIGNED_URL_EXPIRATION: int = 900  # seconds a direct upload URL stays valid
+    FINALIZE_CLAIM_SECONDS: int = 300  # a stuck finalize claim can be retried after this
+    
+    # Image Derivatives
+    IMAGE_WORKERS: int = 2  # processes used for image normalization
+    AI_IMAGE_MAX_DIMENSION: int = 2048  # longest side of the image sent to the AI
+    AI_IMAGE_QUALITY: int = 85
+    THUMBNAIL_MAX_DIMENSION: int = 320
+    THUMBNAIL_QUALITY: int = 75
+    
+    # Local Image Cache
+    IMAGE_CACHE_ENABLED: bool = True
+    IMAGE_CACHE_DIR: str = ".cache/images"  # share between workers on one host
+    IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # 512MB
+    
+    # Extraction Result Cache
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_DIR: str = ".cache/extractions"
+    EXTRACTION_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 64MB
+    EXTRACTION_CACHE_TTL: int = 30 * 24 * 3600  # seconds
+    
+    # Video Receipts
+    VIDEO_WORKERS: int = 1  # processes used for video decoding
+    VIDEO_SAMPLE_FRAMES: int = 24  # frames scored per video
+    VIDEO_MAX_FRAMES: int = 3  # best frames sent to the AI
+    VIDEO_ANALYSIS_WIDTH: int = 640  # frames are scored at this width
+    
+    # Image Quality Gate (local checks before an image is sent to the AI)
+    IMAGE_QUALITY_GATE_ENABLED: bool = True
+    IMAGE_QUALITY_REJECT: bool = True  # False only flags blurry, dark or empty images
+    IMAGE_QUALITY_ANALYSIS_WIDTH: int = 512  # images are checked in grayscale at about this width
+    IMAGE_QUALITY_MIN_SHARPNESS: float = 100.0  # Laplacian variance at analysis width
+    IMAGE_QUALITY_MIN_BRIGHTNESS: float = 40.0  # mean gray level, 0-255
+    IMAGE_QUALITY_MIN_CONTRAST: float = 25.0  # gray level standard deviation in the text area
+    IMAGE_QUALITY_MAX_GLARE: float = 0.25  # share of blown-out pixels in the text area
+    IMAGE_QUALITY_MIN_TEXT_DENSITY: float = 0.002  # share of pixels on text-like edges
     
     # AI/ML Configuration (Step 2)
     GEMINI_API_KEY: str = ""
     OPENAI_API_KEY: str = ""
     
     # AI Processing Settings
-    AI_PROCESSING_TIMEOUT: int = 60  # seconds
+    AI_PROCESSING_TIMEOUT: int = 60  # seconds, per Gemini call
     AI_MAX_RETRIES: int = 3
+    AI_RETRY_BASE_DELAY: float = 1.0  # seconds, doubled on every retry
+    AI_RETRY_MAX_DELAY: float = 20.0
+    AI_MAX_CONCURRENCY: int = 8  # initial concurrent Gemini calls per worker, adapted at runtime
+    PROCESSING_WORKERS: int = 4  # concurrent background extraction jobs
+    PROCESSING_JOB_HISTORY: int = 1000  # finished jobs kept for status queries
+    PROCESSING_LEASE_SECONDS: int = 120  # lease TTL, renewed every third of it while a job is queued or running
+    
+    # Priority Lanes (share of workers and Gemini slots when lanes compete)
+    LANE_WEIGHTS: Dict[str, int] = {"interactive": 4, "bulk": 1}
+    INTERACTIVE_RESERVED_WORKERS: int = 1  # workers bulk jobs may never occupy
+    
+    # Model Cascade (cheapest first; later tiers only see receipts the previous tier was unsure about)
+    AI_MODEL_CASCADE: List[str] = ["gemini-1.5-flash", "gemini-1.5-pro"]
+    AI_ESCALATION_CONFIDENCE: float = 0.7  # escalate below this confidence_score
+    AI_RECONCILE_TOLERANCE: float = 0.01  # relative difference allowed between totals
+    AI_FIELD_REEXTRACTION: bool = True  # re-read only inconsistent fields before escalating
+    
+    # Batched Extraction (bulk queued jobs only)
+    AI_BATCH_ENABLED: bool = True
+    AI_BATCH_SIZE: int = 4  # receipt images per Gemini request, capped at the workers bulk jobs may occupy
+    AI_BATCH_MAX_WAIT: float = 0.5  # seconds to wait for a batch to fill
+    
+    # Streamed Extraction
+    AI_STREAMING_ENABLED: bool = True  # save partial results while Gemini responds
+    AI_PARTIAL_SAVE_INTERVAL: float = 1.0  # seconds between partial item saves
+    
+    # Hedged Gemini Calls (duplicate a call that is slower than usual, keep the first answer)
+    AI_HEDGING_ENABLED: bool = False
+    AI_HEDGE_PERCENTILE: float = 0.95  # hedge once a call outlives this share of recent calls
+    AI_HEDGE_MIN_DELAY: float = 2.0  # never hedge sooner than this, in seconds
+    AI_HEDGE_MIN_SAMPLES: int = 20  # recent calls needed before hedging starts
+    AI_HEDGE_BUDGET: float = 0.05  # extra calls allowed per call, e.g. 0.05 = at most 5% more
+    
+    # Adaptive Concurrency (AIMD limits on in-flight Gemini, Storage and Firestore calls)
+    ADAPTIVE_CONCURRENCY_ENABLED: bool = True  # False keeps every limit at its initial value
+    AIMD_BACKOFF: float = 0.7  # limit multiplier on 429 / RESOURCE_EXHAUSTED or a latency spike
+    AIMD_LATENCY_TOLERANCE: float = 2.0  # a call slower than this x baseline latency is a spike
+    AIMD_MIN_LIMIT: int = 1
+    AI_MAX_CONCURRENCY_CEILING: int = 32
+    STORAGE_MAX_CONCURRENCY: int = 16  # initial concurrent Storage calls per worker
+    STORAGE_MAX_CONCURRENCY_CEILING: int = 64
+    FIRESTORE_MAX_CONCURRENCY: int = 32  # initial concurrent Firestore calls per worker
+    FIRESTORE_MAX_CONCURRENCY_CEILING: int = 128
+    
+    # Circuit Breakers (Gemini, Storage, Firestore)
+    CIRCUIT_FAILURE_RATE: float = 0.5  # open when this share of recent calls failed
+    CIRCUIT_MIN_CALLS: int = 10  # calls needed in the window before the rate counts
+    CIRCUIT_WINDOW: int = 20  # recent calls considered
+    CIRCUIT_OPEN_SECONDS: float = 30.0  # fast-fail period before probing again
+    CIRCUIT_HALF_OPEN_CALLS: int = 1  # concurrent probe calls while half-open
+    
+    # Outbound HTTP (image downloads)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_TIMEOUT: float = 30.0  # seconds
     
     # Database
     FIRESTORE_COLLECTION_RECEIPTS: str = "receipts"
     FIRESTORE_COLLECTION_USERS: str = "users"
+    FIRESTORE_COLLECTION_RECEIPT_HASHES: str = "receipt_hashes"
+    FIRESTORE_COLLECTION_PROCESSING_LEASES: str = "processing_leases"
+    FIRESTORE_COLLECTION_SIGNED_UPLOADS: str = "signed_uploads"
     
     class Config:
         env_file = ".env"
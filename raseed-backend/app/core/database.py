@@ -1,5 +1,5 @@
 import firebase_admin
-from firebase_admin import credentials, firestore, storage
+from firebase_admin import credentials, firestore, firestore_async, storage
 import os
 import logging
 from typing import Optional, Any
@@ -11,12 +11,13 @@ logger = logging.getLogger(__name__)
 
 # Global Firebase clients
 db: Optional[firestore.Client] = None
+async_db: Optional[firestore.AsyncClient] = None
 bucket: Optional[Any] = None  # Firebase storage bucket type
 firebase_initialized: bool = False
 
 def initialize_firebase() -> bool:
     """Initialize Firebase Admin SDK"""
-    global db, bucket, firebase_initialized
+    global db, async_db, bucket, firebase_initialized
 
     if firebase_initialized:
         logger.info("Firebase already initialized")
@@ -69,6 +70,7 @@ def initialize_firebase() -> bool:
 
         # Initialize Firebase clients
         db = firestore.client()
+        async_db = firestore_async.client()
         bucket = storage.bucket()
         firebase_initialized = True
 
@@ -82,6 +84,10 @@ def get_firestore_client() -> Optional[firestore.Client]:
     """Get Firestore client"""
     return db
 
+def get_async_firestore_client() -> Optional[firestore.AsyncClient]:
+    """Get async Firestore client (use from async code)"""
+    return async_db
+
 def get_storage_bucket() -> Optional[Any]:
     """Get Storage bucket"""
     return bucket
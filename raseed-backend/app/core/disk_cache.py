@@ -0,0 +1,119 @@
+# app/core/disk_cache.py
+from fastapi.concurrency import run_in_threadpool
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class DiskLRUCache:
+    """Size-bounded on-disk LRU cache of bytes
+
+    Recency is the file mtime, which is shared by every uvicorn worker
+    using the same directory. Writes go to a temp file that is atomically
+    renamed into place, so readers never see a partial entry. Hit/miss
+    counters are per process.
+    """
+
+    def __init__(self, name: str, directory: str, max_bytes: int, enabled: bool = True):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path_for(self, key: str) -> str:
+        """File path of a cache entry"""
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Blocking read; marks the entry as recently used"""
+        path = self.path_for(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def write(self, key: str, data: bytes) -> None:
+        """Blocking atomic write followed by eviction"""
+        if len(data) > self.max_bytes:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path_for(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits max_bytes"""
+        entries = []
+        total = 0
+        stale_before = time.time() - 3600
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                    if entry.name.startswith(".tmp-"):
+                        # Left behind by a worker that died mid-write
+                        if stat.st_mtime < stale_before:
+                            os.unlink(entry.path)
+                        continue
+                except FileNotFoundError:
+                    continue  # removed by another worker
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.unlink(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Cached bytes for key, or None"""
+        if not self.enabled:
+            return None
+        try:
+            return await run_in_threadpool(self.read, key)
+        except OSError as e:
+            logger.warning(f"⚠️ {self.name} cache read failed: {e}")
+            return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        """Store bytes for key"""
+        if not self.enabled:
+            return
+        try:
+            await run_in_threadpool(self.write, key, data)
+        except OSError as e:
+            logger.warning(f"⚠️ {self.name} cache write failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for this process"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
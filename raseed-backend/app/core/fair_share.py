@@ -0,0 +1,125 @@
+# app/core/fair_share.py
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncio
+import time
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List
+
+# Priority lane of the work running in the current task
+current_lane: ContextVar[str] = ContextVar("current_lane", default="interactive")
+
+# Recent wait times kept per lane for metrics
+WAIT_SAMPLES = 200
+
+def wait_summary(waits: Iterable[float]) -> Dict[str, float]:
+    """Average and maximum of recent wait times, in seconds"""
+    waits = list(waits)
+    if not waits:
+        return {"wait_avg_seconds": 0.0, "wait_max_seconds": 0.0}
+    return {
+        "wait_avg_seconds": round(sum(waits) / len(waits), 3),
+        "wait_max_seconds": round(max(waits), 3)
+    }
+
+class WeightedRoundRobin:
+    """Smooth weighted round robin over lanes
+
+    Each pick goes to one of the given lanes in proportion to its weight,
+    interleaved rather than in bursts. Lanes without a weight count as 1.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        self.weights = dict(weights)
+        self._current: Dict[str, int] = {}
+
+    def pick(self, lanes: List[str]) -> str:
+        """Choose one of the lanes that have work waiting"""
+        total = 0
+        for lane in lanes:
+            weight = self.weights.get(lane, 1)
+            self._current[lane] = self._current.get(lane, 0) + weight
+            total += weight
+
+        chosen = max(lanes, key=lambda lane: self._current[lane])
+        self._current[chosen] -= total
+        return chosen
+
+class FairSemaphore:
+    """Semaphore whose free slots are shared between lanes by weight
+
+    When slots are contended, waiters are admitted lane by lane with
+    weighted round robin, so a lane with a deep backlog can't starve the
+    others. Uncontended acquires are immediate. capacity may be changed
+    at runtime.
+    """
+
+    def __init__(self, capacity: int, weights: Dict[str, int]):
+        self.capacity = capacity
+        self.in_use = 0
+        self._picker = WeightedRoundRobin(weights)
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in weights}
+        self._waits: Dict[str, Deque[float]] = {lane: deque(maxlen=WAIT_SAMPLES) for lane in weights}
+
+    def _has_waiters(self) -> bool:
+        return any(self._waiters.values())
+
+    async def acquire(self, lane: str) -> None:
+        """Wait for a slot on behalf of lane"""
+        waiters = self._waiters.setdefault(lane, deque())
+        waits = self._waits.setdefault(lane, deque(maxlen=WAIT_SAMPLES))
+
+        if self.in_use < self.capacity and not self._has_waiters():
+            self.in_use += 1
+            waits.append(0.0)
+            return
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # granted just as we were cancelled
+            elif future in waiters:
+                waiters.remove(future)
+            raise
+        waits.append(time.monotonic() - started)
+
+    def release(self) -> None:
+        """Free a slot and hand it to the next waiter"""
+        self.in_use -= 1
+        self.wake()
+
+    def wake(self) -> None:
+        """Admit waiters while slots are free (also call after raising capacity)"""
+        while self.in_use < self.capacity:
+            lanes = [lane for lane, waiters in self._waiters.items() if waiters]
+            if not lanes:
+                return
+            future = self._waiters[self._picker.pick(lanes)].popleft()
+            if future.done():
+                continue
+            self.in_use += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, lane: str) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block"""
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Slot usage and per-lane waiting for /health"""
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "lanes": {
+                lane: {"waiting": len(self._waiters.get(lane, ())), **wait_summary(waits)}
+                for lane, waits in self._waits.items()
+            }
+        }
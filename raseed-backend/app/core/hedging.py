@@ -0,0 +1,103 @@
+# app/core/hedging.py
+from collections import deque
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from app.core.config import settings
+
+# Recent latencies kept per key to derive the hedge delay
+LATENCY_SAMPLES = 200
+
+# Most hedges that can be saved up during quiet periods
+MAX_HEDGE_TOKENS = 10.0
+
+class Hedger:
+    """Hedged calls: duplicate a call that is slower than usual and keep the first answer
+
+    Once a call has run longer than AI_HEDGE_PERCENTILE of recent calls
+    with the same key (at least AI_HEDGE_MIN_DELAY), a second identical
+    call is started; whichever succeeds first wins and the other is
+    cancelled. Every call earns AI_HEDGE_BUDGET tokens and every hedge
+    spends one, which caps the extra load at that share of calls.
+    """
+
+    def __init__(self):
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._tokens = 0.0
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.over_budget = 0
+
+    def delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging a call, None while there are too few samples"""
+        latencies = self._latencies.get(key)
+        if not latencies or len(latencies) < settings.AI_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(settings.AI_HEDGE_PERCENTILE * len(ordered)))
+        return max(settings.AI_HEDGE_MIN_DELAY, ordered[index])
+
+    def _record(self, key: str, latency: float) -> None:
+        self._latencies.setdefault(key, deque(maxlen=LATENCY_SAMPLES)).append(latency)
+
+    def _spend(self) -> bool:
+        if self._tokens < 1.0:
+            self.over_budget += 1
+            return False
+        self._tokens -= 1.0
+        return True
+
+    async def run(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        hedge: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Any:
+        """Await call(), starting hedge() (default: call()) if it is slow
+
+        Raises the first call's error if every attempt fails.
+        """
+        if not settings.AI_HEDGING_ENABLED:
+            return await call()
+
+        self.calls += 1
+        self._tokens = min(MAX_HEDGE_TOKENS, self._tokens + settings.AI_HEDGE_BUDGET)
+        started = time.monotonic()
+
+        primary = asyncio.ensure_future(call())
+        pending = {primary}
+        try:
+            delay = self.delay(key)
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and self._spend():
+                    self.hedged += 1
+                    pending.add(asyncio.ensure_future((hedge or call)()))
+
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if winner is not primary:
+                        self.hedge_wins += 1
+                    self._record(key, time.monotonic() - started)
+                    return winner.result()
+                if not pending:
+                    return primary.result()  # every attempt failed: raise the first call's error
+        finally:
+            for task in (primary, *pending):
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hedge counters and current delays for /health"""
+        return {
+            "enabled": settings.AI_HEDGING_ENABLED,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "over_budget": self.over_budget,
+            "delays": {key: self.delay(key) for key in self._latencies}
+        }
@@ -0,0 +1,43 @@
+# app/core/http.py
+import httpx
+import importlib.util
+import logging
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Global HTTP client, shared so downloads reuse pooled keep-alive connections
+http_client: Optional[httpx.AsyncClient] = None
+
+def initialize_http_client() -> httpx.AsyncClient:
+    """Create the shared async HTTP client (HTTP/2 when h2 is installed)"""
+    global http_client
+
+    if http_client is None:
+        http2 = importlib.util.find_spec("h2") is not None
+        http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=10.0),
+            follow_redirects=True
+        )
+        logger.info(f"✅ HTTP client initialized (HTTP/2: {http2})")
+
+    return http_client
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client and its connections"""
+    global http_client
+
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client, creating it if the app lifespan hasn't"""
+    return http_client or initialize_http_client()
@@ -0,0 +1,36 @@
+# app/core/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight call
+
+    The first caller starts the work; callers arriving while it runs await
+    the same result (or exception). The work is shielded, so a cancelled
+    caller doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() unless a call for key is already in flight, and return its result"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+        else:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            future.exception()  # mark retrieved even if every caller went away
+
+    def in_flight(self) -> int:
+        """Number of keys with a call running"""
+        return len(self._calls)
@@ -11,6 +11,18 @@ class ReceiptStatus(str, Enum):
     PROCESSED = "processed"
     ERROR = "error"
 
+class JobState(str, Enum):
+    """Background processing job state"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class ProcessingLane(str, Enum):
+    """Priority class of a processing job"""
+    INTERACTIVE = "interactive"  # a user is waiting for the result
+    BULK = "bulk"  # backfills and reprocessing
+
 class FileMetadata(BaseModel):
     """File metadata"""
     original_filename: str
@@ -18,6 +30,11 @@ class FileMetadata(BaseModel):
     file_size: int
     content_type: str
     upload_date: datetime
+    content_hash: Optional[str] = None  # SHA-256 of the file bytes
+    ai_input_filename: Optional[str] = None  # size-capped copy used for extraction
+    ai_input_url: Optional[str] = None
+    thumbnail_filename: Optional[str] = None  # small copy used by list views
+    thumbnail_url: Optional[str] = None
 
 class ExtractedItem(BaseModel):
     """Individual receipt item"""
@@ -42,6 +59,28 @@ class ExtractedData(BaseModel):
     payment_method: Optional[str] = None
     confidence_score: Optional[float] = None
     raw_text: Optional[str] = None
+    # Which model cascade tier produced the result
+    extraction_model: Optional[str] = None
+    extraction_tier: Optional[int] = None
+    # Image problems found by the local quality gate that may affect the result
+    quality_warnings: List[str] = []
+
+# ExtractedData fields filled in by the backend, left out of the AI response schema
+EXTRACTION_METADATA_FIELDS = {"extraction_model", "extraction_tier", "quality_warnings"}
+
+class ImageQualityReport(BaseModel):
+    """Result of the local image quality checks"""
+    sharpness: float
+    brightness: float
+    contrast: float
+    glare: float
+    text_density: float
+    issues: List[str] = []  # problems that keep the image from being sent to the AI
+    warnings: List[str] = []  # problems worth telling the user about
+    
+    @property
+    def acceptable(self) -> bool:
+        return not self.issues
 
 class ReceiptCreate(BaseModel):
     """Receipt creation model"""
@@ -65,6 +104,17 @@ class ReceiptResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class ProcessingJob(BaseModel):
+    """Background receipt processing job"""
+    job_id: str
+    receipt_id: str
+    state: JobState
+    lane: ProcessingLane = ProcessingLane.INTERACTIVE
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
 class ReceiptListResponse(BaseModel):
     """Receipt list response"""
     receipts: List[ReceiptResponse]
@@ -79,6 +129,43 @@ class UploadResponse(BaseModel):
     download_url: str
     metadata: Dict[str, Any]
     message: Optional[str] = None
+    duplicate: bool = False  # True when an identical file was already uploaded
+    extracted_data: Optional[ExtractedData] = None  # set when uploaded with auto_process
+
+class SignedUploadRequest(BaseModel):
+    """Direct-to-storage upload request"""
+    filename: str
+    content_type: str
+    file_size: Optional[int] = None
+
+class SignedUploadResponse(BaseModel):
+    """Signed URL the client PUTs the file to"""
+    upload_url: str
+    stored_filename: str
+    method: str = "PUT"
+    headers: Dict[str, str]  # must be sent with the PUT request
+    expires_at: datetime
+
+class FinalizeUploadRequest(BaseModel):
+    """Finalize a direct-to-storage upload"""
+    stored_filename: str
+    original_filename: str
+
+class BatchUploadResult(BaseModel):
+    """Result for a single file in a batch upload"""
+    filename: Optional[str] = None
+    success: bool
+    receipt_id: Optional[str] = None
+    download_url: Optional[str] = None
+    duplicate: bool = False
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    """Batch file upload response"""
+    results: List[BatchUploadResult]
+    uploaded: int
+    failed: int
+    message: Optional[str] = None
 
 class ErrorResponse(BaseModel):
     """Error response model"""
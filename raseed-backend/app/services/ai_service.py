@@ -1,19 +1,49 @@
 # app/services/ai_service.py
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import requests
+from google.api_core import exceptions as google_exceptions
+from fastapi.concurrency import run_in_threadpool
 from PIL import Image
+import asyncio
+import hashlib
 import io
+import random
 import json
 import logging
-from typing import Optional, Dict, Any
+from pydantic import ValidationError
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
 from app.core.config import settings
-from app.models.receipt import ExtractedData, ExtractedItem
+from app.core.http import get_http_client
+from app.core.circuit_breaker import gemini_breaker, storage_breaker
+from app.core.adaptive_limit import gemini_limiter, storage_limiter
+from app.core.hedging import Hedger
+from app.core.single_flight import SingleFlight
+from app.models.receipt import ExtractedData, EXTRACTION_METADATA_FIELDS
+from app.services.video_service import video_service
+from app.services.image_cache import image_cache
+from app.services.extraction_cache import extraction_cache, content_hash
+from app.services.batch_extractor import BatchExtractor
+from app.services.response_schema import gemini_schema
+from app.services.extraction_progress import ExtractionProgress
+from app.services.image_quality import ImageQualityError, assess_image
+from app.services.processing_lease import processing_lease
+from app.services.reconciliation import totals_reconcile, fix_locally, inconsistent_fields
 
 logger = logging.getLogger(__name__)
 
+# Gemini errors worth retrying (rate limits and transient server failures)
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.Aborted,
+)
+
 class AIService:
     """Service class for AI-powered receipt processing using Gemini Vision"""
     
@@ -21,32 +51,222 @@ class AIService:
         """Initialize Gemini AI client"""
         if settings.GEMINI_API_KEY:
             genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            logger.info("✅ Gemini AI initialized successfully")
+            # Model cascade, cheapest first; self.model is the first tier
+            self.model_names = list(settings.AI_MODEL_CASCADE)
+            self.models = [genai.GenerativeModel(name) for name in self.model_names]
+            self.model = self.models[0]
+            logger.info(f"✅ Gemini AI initialized successfully: {' -> '.join(self.model_names)}")
         else:
+            self.model_names = []
+            self.models = []
             self.model = None
             logger.warning("⚠️ GEMINI_API_KEY not found - AI features disabled")
+        
+        self.results_by_tier = [0] * len(self.model_names)
+        self.escalations = 0
+        self.local_fixes = 0
+        self.field_reextractions = 0
+        self.quality_rejections = 0
+        
+        self.batcher = BatchExtractor(self)
+        
+        # Slow Gemini calls get a duplicate request, within AI_HEDGE_BUDGET
+        self.hedger = Hedger()
+        
+        # Concurrent processing of the same receipt shares one extraction
+        self.receipt_flights = SingleFlight()
+        
+        # Gemini returns JSON constrained to this schema, so no text scraping is needed
+        self.response_schema = gemini_schema(ExtractedData, exclude=EXTRACTION_METADATA_FIELDS)
     
     def is_available(self) -> bool:
         """Check if AI service is available"""
         return self.model is not None
     
-    async def download_image_from_url(self, image_url: str) -> Optional[Image.Image]:
+    @property
+    def model_name(self) -> str:
+        """Name of the whole cascade, used in extraction cache keys"""
+        return "+".join(self.model_names)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cascade counters for /health"""
+        return {
+            "cascade": self.model_names,
+            "results_by_tier": self.results_by_tier,
+            "escalations": self.escalations,
+            "local_fixes": self.local_fixes,
+            "field_reextractions": self.field_reextractions,
+            "quality_rejections": self.quality_rejections,
+            "coalesced_requests": self.receipt_flights.shared,
+            "hedging": self.hedger.stats()
+        }
+    
+    async def generate_content(
+        self,
+        contents: List[Any],
+        progress: Optional[ExtractionProgress] = None,
+        tier: int = 0,
+        call_kind: str = "extract",
+        **kwargs
+    ) -> Any:
+        """Call the Gemini model of a cascade tier without blocking the event loop
+
+        Each attempt waits for a slot of the adaptive Gemini concurrency
+        limit (shared between priority lanes) and is cut off after
+        AI_PROCESSING_TIMEOUT seconds. Retryable errors are retried up to
+        AI_MAX_RETRIES times with exponential backoff and full jitter.
+        With progress, the response is streamed into it as it arrives.
+        With AI_HEDGING_ENABLED, an attempt that runs unusually long is
+        hedged with a duplicate request (see Hedger); the hedge bypasses the
+        concurrency limit, so it isn't stuck behind the slow call under load,
+        and only the Hedger's token budget caps it. Latency is only
+        compared with earlier calls of the same tier and call_kind.
+        Raises CircuitOpenError without calling Gemini while its circuit is open.
+        """
+        model = self.models[tier] if tier else self.model
+        kind = f"{self.model_names[tier]}:{call_kind}" + (":stream" if progress else "")
+        attempt = 0
+        while True:
+            try:
+                async with gemini_breaker.guard(), gemini_limiter.guard(kind):
+                    return await asyncio.wait_for(
+                        self.hedger.run(
+                            kind,
+                            lambda: self._generate(model, contents, progress, **kwargs),
+                            lambda: self._hedge(model, contents, **kwargs)
+                        ),
+                        timeout=settings.AI_PROCESSING_TIMEOUT
+                    )
+            except RETRYABLE_ERRORS as e:
+                if attempt >= settings.AI_MAX_RETRIES:
+                    raise
+                
+                backoff = min(settings.AI_RETRY_MAX_DELAY, settings.AI_RETRY_BASE_DELAY * 2 ** attempt)
+                delay = random.uniform(0, backoff)
+                attempt += 1
+                logger.warning(
+                    f"⚠️ Gemini call failed ({type(e).__name__}), "
+                    f"retry {attempt}/{settings.AI_MAX_RETRIES} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+    
+    async def _generate(self, model: Any, contents: List[Any], progress: Optional[ExtractionProgress], **kwargs) -> Any:
+        """One Gemini attempt, streamed into progress when given"""
+        if progress is None:
+            return await model.generate_content_async(contents, **kwargs)
+        
+        progress.reset()
+        response = await model.generate_content_async(contents, stream=True, **kwargs)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # chunk without text, e.g. only a finish reason
+            await progress.feed(text)
+        
+        # The response aggregates all chunks once the stream is consumed
+        return response
+    
+    async def _hedge(self, model: Any, contents: List[Any], **kwargs) -> Any:
+        """Duplicate of a slow attempt: not streamed, and outside the limiter so its latency stays out of the baselines"""
+        return await model.generate_content_async(contents, **kwargs)
+    
+    def generation_options(
+        self,
+        max_output_tokens: int = 2048,
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Safety settings and schema-constrained JSON generation config for extraction calls"""
+        return {
+            "safety_settings": {
+                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+            },
+            "generation_config": genai.types.GenerationConfig(
+                temperature=0.1,  # Low temperature for consistent extraction
+                top_p=0.8,
+                top_k=40,
+                max_output_tokens=max_output_tokens,
+                response_mime_type="application/json",
+                response_schema=response_schema or self.response_schema,
+            )
+        }
+    
+    def open_image(self, data: bytes) -> Image.Image:
+        """Decode image bytes into an RGB PIL Image (blocking)"""
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        
+        # Convert to RGB if necessary
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        return image
+    
+    async def load_images(self, data: bytes, content_type: Optional[str] = None) -> List[Image.Image]:
+        """Decode an in-memory image, or select the best frames of a video"""
+        if content_type and content_type.startswith("video/"):
+            # Decode and score frames in the video worker pool
+            frames = await video_service.select_frames(data)
+            return [Image.open(io.BytesIO(frame)) for frame in frames]
+        
+        # Decode off the event loop
+        return [await run_in_threadpool(self.open_image, data)]
+    
+    async def fetch_bytes(self, url: str, cache_key: Optional[str] = None, timeout: int = 30) -> bytes:
+        """Download file bytes, reading through the local image cache
+
+        cache_key is the file's stored_filename; without it the cache is skipped.
+        """
+        if cache_key:
+            data = await image_cache.get(cache_key)
+            if data is not None:
+                logger.info(f"📦 Image cache hit: {cache_key}")
+                return data
+        
+        logger.info(f"📥 Downloading from: {url}")
+        data = await self.download_bytes(url, timeout=timeout)
+        
+        if cache_key:
+            await image_cache.put(cache_key, data)
+        return data
+    
+    async def download_bytes(self, url: str, timeout: float = 30, max_bytes: Optional[int] = None) -> bytes:
+        """Stream a download through the shared HTTP client, capped at max_bytes"""
+        max_bytes = max_bytes or settings.MAX_FILE_SIZE
+        
+        async with (
+            storage_breaker.guard(),
+            storage_limiter.guard("download") as call,
+            get_http_client().stream("GET", url, timeout=timeout) as response
+        ):
+            response.raise_for_status()
+            
+            content_length = response.headers.get("content-length")
+            if content_length and int(content_length) > max_bytes:
+                raise ValueError(f"File too large: {content_length} bytes")
+            
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > max_bytes:
+                    raise ValueError(f"File too large: more than {max_bytes} bytes")
+                chunks.append(chunk)
+            call.sized(received)
+        
+        return b"".join(chunks)
+    
+    async def download_image_from_url(self, image_url: str, cache_key: Optional[str] = None) -> Optional[Image.Image]:
         """Download and process image from Firebase Storage URL"""
         try:
-            logger.info(f"📥 Downloading image from: {image_url}")
-            
             # Download image
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            
-            # Convert to PIL Image
-            image_data = io.BytesIO(response.content)
-            image = Image.open(image_data)
+            data = await self.fetch_bytes(image_url, cache_key=cache_key)
             
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            # Convert to PIL Image off the event loop
+            image = await run_in_threadpool(self.open_image, data)
             
             logger.info(f"✅ Image downloaded successfully: {image.size}")
             return image
@@ -58,33 +278,23 @@ class AIService:
     def create_extraction_prompt(self) -> str:
         """Create the prompt for receipt data extraction"""
         return """
-        You are an expert receipt data extractor. Analyze this receipt image and extract the following information in JSON format.
+        You are an expert receipt data extractor. Analyze this receipt image and extract its data
+        into the response schema.
 
-        Return ONLY a valid JSON object with this exact structure:
-
-        {
-            "merchant_name": "string - name of the store/restaurant",
-            "merchant_address": "string - full address if visible",
-            "receipt_date": "string - date in YYYY-MM-DD format",
-            "receipt_time": "string - time in HH:MM format",
-            "receipt_number": "string - receipt/transaction number",
-            "payment_method": "string - cash, card, etc.",
-            "currency": "string - currency code (USD, EUR, etc.)",
-            "items": [
-                {
-                    "name": "string - item name",
-                    "quantity": number - quantity (default 1),
-                    "unit_price": number - price per unit,
-                    "total_price": number - total for this item,
-                    "category": "string - food, household, etc."
-                }
-            ],
-            "subtotal": number - subtotal before tax,
-            "tax_amount": number - tax amount,
-            "total_amount": number - final total,
-            "confidence_score": number - your confidence (0.0 to 1.0),
-            "raw_text": "string - any additional text you see"
-        }
+        Field notes:
+        - merchant_name: name of the store/restaurant
+        - merchant_address: full address if visible
+        - receipt_date: date in YYYY-MM-DD format
+        - receipt_time: time in HH:MM format
+        - receipt_number: receipt/transaction number
+        - payment_method: cash, card, etc.
+        - currency: currency code (USD, EUR, etc.)
+        - items: every purchased item; quantity defaults to 1, category is food, household, etc.
+        - subtotal: subtotal before tax
+        - tax_amount: tax amount
+        - total_amount: final total
+        - confidence_score: your confidence (0.0 to 1.0)
+        - raw_text: any additional text you see
 
         Rules:
         1. Extract ALL visible items with their prices
@@ -93,11 +303,28 @@ class AIService:
         4. Include partial data even if some fields are unclear
         5. For prices, use decimal numbers (e.g., 12.99, not "$12.99")
         6. Guess reasonable categories for items
-        7. Return only the JSON, no additional text
         """
     
-    async def extract_receipt_data(self, image_url: str) -> Optional[ExtractedData]:
-        """Extract structured data from receipt image using Gemini Vision"""
+    @property
+    def prompt_version(self) -> str:
+        """Short hash of the extraction prompt and schema; changes whenever either does"""
+        version = self.create_extraction_prompt() + json.dumps(self.response_schema, sort_keys=True)
+        return hashlib.sha256(version.encode()).hexdigest()[:12]
+    
+    async def extract_receipt_data(
+        self,
+        image_url: str,
+        content_type: Optional[str] = None,
+        cache_key: Optional[str] = None,
+        use_cache: bool = True,
+        batch: bool = False,
+        progress: Optional[ExtractionProgress] = None
+    ) -> Optional[ExtractedData]:
+        """Extract structured data from receipt image (or video) using Gemini Vision
+
+        cache_key (the stored_filename behind image_url) enables the local image
+        cache; use_cache=False forces a fresh extraction.
+        """
         if not self.is_available():
             logger.error("❌ Gemini AI not available")
             return None
@@ -105,102 +332,269 @@ class AIService:
         try:
             logger.info(f"🤖 Starting AI extraction for: {image_url}")
             
-            # Download image
-            image = await self.download_image_from_url(image_url)
-            if not image:
+            # Download image or video bytes
+            timeout = 60 if content_type and content_type.startswith("video/") else 30
+            data = await self.fetch_bytes(image_url, cache_key=cache_key, timeout=timeout)
+            
+            return await self.extract_receipt_data_from_bytes(
+                data, content_type, use_cache=use_cache, batch=batch, progress=progress
+            )
+            
+        except ImageQualityError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ AI extraction failed: {e}")
+            return None
+    
+    async def extract_receipt_data_from_bytes(
+        self,
+        data: bytes,
+        content_type: Optional[str] = None,
+        use_cache: bool = True,
+        batch: bool = False,
+        progress: Optional[ExtractionProgress] = None
+    ) -> Optional[ExtractedData]:
+        """Extract structured data from in-memory receipt bytes (no download)
+
+        Results are cached by (content hash, prompt version, model);
+        use_cache=False skips the lookup but still stores the fresh result.
+        With batch set, single images are sent together with other receipts.
+        Partial results are streamed into progress when given. Images that
+        fail the local quality gate raise ImageQualityError without a
+        Gemini call.
+        """
+        if not self.is_available():
+            logger.error("❌ Gemini AI not available")
+            return None
+        
+        try:
+            logger.info(f"🤖 Starting AI extraction for {len(data)} in-memory bytes")
+            
+            digest = await run_in_threadpool(content_hash, data)
+            extraction_key = extraction_cache.make_key(digest, self.prompt_version, self.model_name)
+            
+            if use_cache:
+                cached = await extraction_cache.get(extraction_key)
+                if cached:
+                    logger.info("📦 Extraction cache hit")
+                    return cached
+            
+            images = await self.load_images(data, content_type)
+            if not images:
                 return None
             
+            images, quality_warnings = await self.check_image_quality(images)
+            
+            if batch and settings.AI_BATCH_ENABLED and len(images) == 1:
+                return await self.batcher.extract(
+                    images[0], extraction_key=extraction_key, progress=progress, quality_warnings=quality_warnings
+                )
+            return await self.extract_from_images(
+                images, extraction_key=extraction_key, progress=progress, quality_warnings=quality_warnings
+            )
+            
+        except ImageQualityError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ AI extraction failed: {e}")
+            return None
+    
+    async def check_image_quality(self, images: List[Image.Image]) -> Tuple[List[Image.Image], List[str]]:
+        """Run the local quality gate before any Gemini call
+
+        Returns the images that passed (video frames are checked one by one)
+        and the warnings of the first of them. Raises ImageQualityError with
+        the first image's feedback when none passed.
+        """
+        if not settings.IMAGE_QUALITY_GATE_ENABLED:
+            return images, []
+        
+        reports = [await run_in_threadpool(assess_image, image) for image in images]
+        passed = [(image, report) for image, report in zip(images, reports) if report.acceptable]
+        if not passed:
+            self.quality_rejections += 1
+            logger.info(f"🖼️ Image rejected by quality gate: {reports[0].issues}")
+            raise ImageQualityError(reports[0])
+        
+        return [image for image, _ in passed], passed[0][1].warnings
+    
+    def needs_escalation(self, data: ExtractedData) -> bool:
+        """Whether a result is unsure enough to try the next cascade tier"""
+        if data.confidence_score is None or data.confidence_score < settings.AI_ESCALATION_CONFIDENCE:
+            return True
+        return not totals_reconcile(data)
+    
+    async def extract_from_images(
+        self,
+        images: List[Image.Image],
+        extraction_key: Optional[str] = None,
+        progress: Optional[ExtractionProgress] = None,
+        start_tier: int = 0,
+        previous: Optional[ExtractedData] = None,
+        quality_warnings: Optional[List[str]] = None
+    ) -> Optional[ExtractedData]:
+        """Run Gemini Vision extraction on already loaded receipt images
+
+        Walks the model cascade from start_tier, moving to the next tier while
+        the result has low confidence or its totals still don't reconcile
+        after reconcile_result. previous is a result already obtained from the
+        tier before start_tier. quality_warnings from the quality gate are
+        attached to the result, and successfully parsed results are stored
+        under extraction_key if given.
+        """
+        if not self.is_available():
+            logger.error("❌ Gemini AI not available")
+            return None
+        
+        if previous is not None:
+            previous = await self.reconcile_result(images, previous)
+        
+        result, valid = previous, previous is not None
+        for tier in range(start_tier, len(self.models)):
+            if valid and not self.needs_escalation(result):
+                break
+            if tier > 0:
+                self.escalations += 1
+                logger.info(f"⬆️ Escalating extraction to {self.model_names[tier]}")
+            
+            candidate, candidate_valid = await self.extract_with_model(images, tier, progress)
+            if candidate is None:
+                break  # call failed; keep the best result so far
+            if candidate_valid:
+                candidate = await self.reconcile_result(images, candidate)
+            if candidate_valid or result is None:
+                result, valid = candidate, candidate_valid
+        
+        if result is not None:
+            result.quality_warnings = quality_warnings or []
+        if result is not None and valid:
+            self.results_by_tier[result.extraction_tier] += 1
+            if extraction_key:
+                await extraction_cache.put(extraction_key, result)
+        return result
+    
+    async def extract_with_model(
+        self,
+        images: List[Image.Image],
+        tier: int,
+        progress: Optional[ExtractionProgress] = None
+    ) -> Tuple[Optional[ExtractedData], bool]:
+        """One extraction with a single cascade tier
+
+        Returns the result and whether it passed schema validation; None if
+        the call failed.
+        """
+        raw_response = ""
+        try:
             # Create prompt
             prompt = self.create_extraction_prompt()
-            
-            # Safety settings
-            safety_settings = {
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            }
+            if len(images) > 1:
+                prompt += "\nThe images are frames from a video of the same receipt. Combine them into a single result.\n"
             
             # Generate content
-            logger.info("🧠 Sending image to Gemini Vision...")
-            response = self.model.generate_content(
-                [prompt, image],
-                safety_settings=safety_settings,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,  # Low temperature for consistent extraction
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=2048,
-                )
+            logger.info(f"🧠 Sending image to Gemini Vision ({self.model_names[tier]})...")
+            response = await self.generate_content(
+                [prompt, *images], progress=progress, tier=tier, **self.generation_options()
             )
             
-            # Extract JSON from response
+            # Parse and validate the schema-constrained JSON in one pass
             raw_response = response.text.strip()
             logger.info(f"🤖 Raw AI response: {raw_response[:200]}...")
             
-            # Clean and parse JSON
-            json_str = self.clean_json_response(raw_response)
-            extracted_json = json.loads(json_str)
-            
-            # Convert to ExtractedData model
-            extracted_data = self.json_to_extracted_data(extracted_json)
+            extracted_data = ExtractedData.model_validate_json(raw_response)
+            extracted_data.extraction_model = self.model_names[tier]
+            extracted_data.extraction_tier = tier
             
             logger.info(f"✅ AI extraction successful! Confidence: {extracted_data.confidence_score}")
-            return extracted_data
+            return extracted_data, True
             
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ JSON parsing error: {e}")
+        except ValidationError as e:
+            logger.error(f"❌ AI response failed schema validation: {e}")
             logger.error(f"Raw response: {raw_response}")
-            return self.create_fallback_data(raw_response)
+            fallback = self.create_fallback_data(raw_response)
+            fallback.extraction_model = self.model_names[tier]
+            fallback.extraction_tier = tier
+            return fallback, False
             
         except Exception as e:
             logger.error(f"❌ AI extraction failed: {e}")
-            return None
+            return None, False
     
-    def clean_json_response(self, response: str) -> str:
-        """Clean AI response to extract valid JSON"""
-        # Remove markdown code blocks
-        response = response.replace("```json", "").replace("```", "")
+    async def reconcile_result(self, images: List[Image.Image], data: ExtractedData) -> ExtractedData:
+        """Fix amounts that don't add up without re-running the whole extraction
+
+        Derivable amounts are filled in locally first. If totals still don't
+        reconcile, the model that produced the result re-reads only the
+        inconsistent fields.
+        """
+        data, fixes = fix_locally(data)
+        self.local_fixes += fixes
+        
+        fields = inconsistent_fields(data)
+        if not fields or not settings.AI_FIELD_REEXTRACTION:
+            return data
         
-        # Find JSON object
-        start = response.find("{")
-        end = response.rfind("}") + 1
+        corrections = await self.reextract_fields(images, data, fields)
+        if not corrections:
+            return data
         
-        if start == -1 or end == 0:
-            raise ValueError("No JSON object found in response")
+        corrected, fixes = fix_locally(ExtractedData(**{**data.model_dump(), **corrections}))
+        if len(inconsistent_fields(corrected)) >= len(fields):
+            logger.info(f"🧮 Re-extracted {', '.join(fields)} still don't reconcile")
+            return data
         
-        return response[start:end].strip()
+        logger.info(f"🧮 Reconciled {', '.join(fields)} by targeted re-extraction")
+        return corrected
     
-    def json_to_extracted_data(self, data: Dict[str, Any]) -> ExtractedData:
-        """Convert JSON response to ExtractedData model"""
-        # Convert items
-        items = []
-        for item_data in data.get("items", []):
-            item = ExtractedItem(
-                name=item_data.get("name", "Unknown Item"),
-                quantity=item_data.get("quantity", 1),
-                unit_price=item_data.get("unit_price"),
-                total_price=item_data.get("total_price"),
-                category=item_data.get("category")
+    def create_field_prompt(self, data: ExtractedData, fields: List[str]) -> str:
+        """Short prompt asking the model to re-read a few inconsistent fields"""
+        current = data.model_dump(include={"items", "subtotal", "tax_amount", "total_amount"})
+        return f"""
+        These amounts were read from this receipt but do not add up:
+        {json.dumps(current)}
+
+        Re-read the receipt carefully and return only these fields: {", ".join(fields)}.
+        Line totals should equal quantity x unit_price, items should add up to the subtotal,
+        and subtotal plus tax should equal the total. Use decimal numbers and null for
+        values that are not printed.
+        """
+    
+    async def reextract_fields(
+        self,
+        images: List[Image.Image],
+        data: ExtractedData,
+        fields: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Ask the result's own model tier for just the given fields
+
+        Only values the model actually returned are kept, so a field it
+        leaves out or nulls never wipes an amount that was already read.
+        """
+        try:
+            self.field_reextractions += 1
+            schema = {
+                "type": "object",
+                "properties": {name: self.response_schema["properties"][name] for name in fields},
+                "required": list(fields)
+            }
+            
+            logger.info(f"🧮 Re-extracting inconsistent fields: {', '.join(fields)}")
+            response = await self.generate_content(
+                [self.create_field_prompt(data, fields), *images],
+                tier=data.extraction_tier or 0,
+                call_kind="fields",
+                **self.generation_options(response_schema=schema)
             )
-            items.append(item)
-        
-        # Create ExtractedData
-        return ExtractedData(
-            merchant_name=data.get("merchant_name"),
-            merchant_address=data.get("merchant_address"),
-            receipt_date=data.get("receipt_date"),
-            receipt_time=data.get("receipt_time"),
-            receipt_number=data.get("receipt_number"),
-            payment_method=data.get("payment_method"),
-            currency=data.get("currency", "USD"),
-            items=items,
-            subtotal=data.get("subtotal"),
-            tax_amount=data.get("tax_amount"),
-            total_amount=data.get("total_amount"),
-            confidence_score=data.get("confidence_score", 0.5),
-            raw_text=data.get("raw_text", "")
-        )
+            
+            values = ExtractedData.model_validate_json(response.text)
+            corrections = values.model_dump(include=set(fields), exclude_unset=True, exclude_none=True)
+            if not corrections.get("items", True):
+                del corrections["items"]  # an empty list would drop the items already read
+            return corrections or None
+            
+        except Exception as e:
+            logger.error(f"❌ Field re-extraction failed: {e}")
+            return None
     
     def create_fallback_data(self, raw_response: str) -> ExtractedData:
         """Create fallback data when JSON parsing fails"""
@@ -222,54 +616,107 @@ class AIService:
             raw_text=raw_response[:500]  # Store partial response for debugging
         )
     
-    async def process_receipt_async(self, receipt_id: str, image_url: str) -> bool:
-        """Process receipt asynchronously (for background tasks)"""
+    async def process_receipt_async(
+        self,
+        receipt_id: str,
+        image_url: Optional[str] = None,
+        content_type: Optional[str] = None,
+        image_data: Optional[bytes] = None,
+        cache_key: Optional[str] = None,
+        use_cache: bool = True,
+        batch: bool = False,
+        lease_job_id: Optional[str] = None
+    ) -> Optional[ExtractedData]:
+        """Process receipt asynchronously (for background tasks)
+
+        When image_data is given it is used directly instead of downloading
+        image_url. Partial results are saved to the receipt while the response
+        streams in. Concurrent calls for the same receipt share one run and
+        its result. With lease_job_id, the result is only saved while that
+        job still holds the receipt's processing lease. Returns the extracted
+        data, or None if processing failed.
+        """
+        return await self.receipt_flights.do(
+            receipt_id,
+            lambda: self._process_receipt(
+                receipt_id, image_url, content_type, image_data, cache_key, use_cache, batch, lease_job_id
+            )
+        )
+    
+    async def _process_receipt(
+        self,
+        receipt_id: str,
+        image_url: Optional[str],
+        content_type: Optional[str],
+        image_data: Optional[bytes],
+        cache_key: Optional[str],
+        use_cache: bool,
+        batch: bool,
+        lease_job_id: Optional[str]
+    ) -> Optional[ExtractedData]:
+        """Extract a receipt and store the result or error on its document"""
+        from app.services.receipt_service import ReceiptService
+        from app.models.receipt import ReceiptUpdate, ReceiptStatus
+        
         try:
             logger.info(f"🔄 Processing receipt {receipt_id} asynchronously")
+            progress = ExtractionProgress(receipt_id, lease_job_id) if settings.AI_STREAMING_ENABLED else None
             
             # Extract data
-            extracted_data = await self.extract_receipt_data(image_url)
+            if image_data is not None:
+                extracted_data = await self.extract_receipt_data_from_bytes(
+                    image_data, content_type=content_type, use_cache=use_cache,
+                    batch=batch, progress=progress
+                )
+            else:
+                extracted_data = await self.extract_receipt_data(
+                    image_url, content_type=content_type, cache_key=cache_key,
+                    use_cache=use_cache, batch=batch, progress=progress
+                )
+            
+            # Another worker took over the receipt while this one was extracting
+            if lease_job_id and not await processing_lease.holds(receipt_id, lease_job_id):
+                logger.warning(f"🔒 Lost the processing lease for receipt {receipt_id}, not saving the result")
+                return None
             
             if extracted_data:
-                # Update receipt in database (we'll implement this in receipt_service)
-                from app.services.receipt_service import ReceiptService
-                from app.models.receipt import ReceiptUpdate, ReceiptStatus
-                
                 update_data = ReceiptUpdate(
                     extracted_data=extracted_data,
-                    status=ReceiptStatus.PROCESSED
+                    status=ReceiptStatus.PROCESSED,
+                    processing_error=None
                 )
                 
                 success = await ReceiptService.update_receipt(receipt_id, update_data)
                 
                 if success:
                     logger.info(f"✅ Receipt {receipt_id} processed successfully")
-                    return True
+                    return extracted_data
                 else:
                     logger.error(f"❌ Failed to update receipt {receipt_id} in database")
-                    return False
+                    return None
             else:
-                # Mark as error
+                # Mark as error, dropping any partial result saved while streaming
                 update_data = ReceiptUpdate(
+                    extracted_data=None,
                     status=ReceiptStatus.ERROR,
                     processing_error="AI extraction failed"
                 )
                 await ReceiptService.update_receipt(receipt_id, update_data)
-                return False
+                return None
                 
         except Exception as e:
             logger.error(f"❌ Async processing failed for receipt {receipt_id}: {e}")
+            if lease_job_id and not await processing_lease.holds(receipt_id, lease_job_id):
+                return None
             
-            # Mark as error
-            from app.services.receipt_service import ReceiptService
-            from app.models.receipt import ReceiptUpdate, ReceiptStatus
-            
+            # Mark as error, dropping any partial result saved while streaming
             update_data = ReceiptUpdate(
+                extracted_data=None,
                 status=ReceiptStatus.ERROR,
                 processing_error=str(e)
             )
             await ReceiptService.update_receipt(receipt_id, update_data)
-            return False
+            return None
 
 # Create global instance
 ai_service = AIService()
\ No newline at end of file
@@ -0,0 +1,194 @@
+# app/services/batch_extractor.py
+from dataclasses import dataclass
+from PIL import Image
+from pydantic import TypeAdapter, ValidationError
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.models.receipt import ExtractedData, EXTRACTION_METADATA_FIELDS
+from app.services.response_schema import gemini_schema
+from app.services.extraction_progress import ExtractionProgress
+from app.services.job_queue import bulk_worker_limit
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PendingExtraction:
+    """A receipt image waiting for the next batch"""
+    image: Image.Image
+    extraction_key: Optional[str]
+    progress: Optional[ExtractionProgress]
+    quality_warnings: Optional[List[str]]
+    future: asyncio.Future
+
+class BatchExtractedData(ExtractedData):
+    """One receipt of a batch response"""
+    receipt_index: int
+
+BATCH_RESPONSE = TypeAdapter(List[BatchExtractedData])
+
+class BatchExtractor:
+    """Packs single-image extractions into multi-receipt Gemini requests
+
+    Callers await extract(); pending images are sent together once
+    batch_size of them are waiting or AI_BATCH_MAX_WAIT seconds after
+    the first one arrived. Only bulk jobs are batched, so the batch size
+    is capped at the workers they may occupy; larger batches could never
+    fill. The model returns a JSON array keyed by receipt_index. Receipts
+    missing from an invalid batch response, or all of them when the batch
+    call fails, are retried with regular per-receipt calls; unsure results
+    are escalated through the rest of the model cascade one receipt at a
+    time.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._pending: List[PendingExtraction] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_receipts = 0
+        self.fallbacks = 0
+        self.response_schema = {"type": "array", "items": gemini_schema(BatchExtractedData, exclude=EXTRACTION_METADATA_FIELDS)}
+
+    async def extract(
+        self,
+        image: Image.Image,
+        extraction_key: Optional[str] = None,
+        progress: Optional[ExtractionProgress] = None,
+        quality_warnings: Optional[List[str]] = None
+    ) -> Optional[ExtractedData]:
+        """Extract one receipt image as part of the next batch
+
+        progress is only streamed into when the receipt ends up on its own.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(PendingExtraction(image, extraction_key, progress, quality_warnings, future))
+
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(settings.AI_BATCH_MAX_WAIT, self._flush)
+
+        return await future
+
+    @property
+    def batch_size(self) -> int:
+        """Receipts per batch: AI_BATCH_SIZE, at most the workers bulk jobs may occupy"""
+        return max(1, min(settings.AI_BATCH_SIZE, bulk_worker_limit()))
+
+    def _flush(self) -> None:
+        """Send everything pending as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        batch = [entry for entry in batch if not entry.future.done()]
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def create_batch_prompt(self, count: int) -> str:
+        """Extraction prompt asking for one result per labelled receipt"""
+        return self.service.create_extraction_prompt() + f"""
+        You are given {count} different receipts. Each image is preceded by a label "Receipt N:".
+        Return an array with exactly {count} results, one per receipt, each with
+        receipt_index equal to N from the receipt's label.
+        """
+
+    async def _run(self, batch: List[PendingExtraction]) -> None:
+        """Extract a batch and resolve every waiting caller"""
+        try:
+            if len(batch) == 1:
+                entry = batch[0]
+                results = [await self.service.extract_from_images(
+                    [entry.image],
+                    extraction_key=entry.extraction_key,
+                    progress=entry.progress,
+                    quality_warnings=entry.quality_warnings
+                )]
+            else:
+                try:
+                    results = await self._extract_batch(batch)
+                except Exception as e:
+                    logger.error(f"❌ Batch extraction failed: {e}")
+                    results = [None] * len(batch)
+
+                missing = [index for index, result in enumerate(results) if result is None]
+                if missing:
+                    self.fallbacks += len(missing)
+                    logger.warning(f"⚠️ Batch missing {len(missing)}/{len(batch)} receipts, extracting individually")
+
+                # Malformed or missing entries get per-receipt calls; batch
+                # results continue up the model cascade from the next tier
+                results = await asyncio.gather(*(
+                    self.service.extract_from_images(
+                        [entry.image],
+                        extraction_key=entry.extraction_key,
+                        progress=entry.progress,
+                        start_tier=0 if result is None else 1,
+                        previous=result,
+                        quality_warnings=entry.quality_warnings
+                    )
+                    for entry, result in zip(batch, results)
+                ))
+        except Exception as e:
+            logger.error(f"❌ Extraction of batched receipts failed: {e}")
+            results = [None] * len(batch)
+
+        for entry, result in zip(batch, results):
+            if not entry.future.done():
+                entry.future.set_result(result)
+
+    async def _extract_batch(self, batch: List[PendingExtraction]) -> List[Optional[ExtractedData]]:
+        """One first-tier Gemini call for the whole batch; None marks receipts needing a retry"""
+        contents: List[Any] = [self.create_batch_prompt(len(batch))]
+        for index, entry in enumerate(batch):
+            contents += [f"Receipt {index}:", entry.image]
+
+        logger.info(f"🧠 Sending batch of {len(batch)} receipts to Gemini Vision...")
+        response = await self.service.generate_content(
+            contents,
+            call_kind=f"batch{len(batch)}",
+            **self.service.generation_options(
+                max_output_tokens=min(8192, 2048 * len(batch)),
+                response_schema=self.response_schema
+            )
+        )
+        self.batches += 1
+        self.batched_receipts += len(batch)
+
+        results: List[Optional[ExtractedData]] = [None] * len(batch)
+        try:
+            entries = BATCH_RESPONSE.validate_json(response.text)
+        except ValidationError as e:
+            logger.error(f"❌ Batch response failed schema validation: {e}")
+            return results
+
+        for entry in entries:
+            index = entry.receipt_index
+            if not 0 <= index < len(batch) or results[index] is not None:
+                continue
+            results[index] = ExtractedData(
+                **entry.model_dump(exclude={"receipt_index", *EXTRACTION_METADATA_FIELDS}),
+                extraction_model=self.service.model_names[0],
+                extraction_tier=0
+            )
+
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        """Batch counters for /health"""
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "batched_receipts": self.batched_receipts,
+            "fallbacks": self.fallbacks
+        }
@@ -0,0 +1,80 @@
+# app/services/extraction_cache.py
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.disk_cache import DiskLRUCache
+from app.models.receipt import ExtractedData
+
+logger = logging.getLogger(__name__)
+
+class ExtractionCache:
+    """Persistent cache of extraction results
+
+    Keyed by (image content hash, prompt version, model name), so editing the
+    prompt or switching models invalidates old entries without a flush.
+    Entries expire after EXTRACTION_CACHE_TTL seconds; the disk cache evicts
+    least recently used entries beyond EXTRACTION_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self):
+        self.store = DiskLRUCache(
+            "Extraction",
+            settings.EXTRACTION_CACHE_DIR,
+            settings.EXTRACTION_CACHE_MAX_BYTES,
+            enabled=settings.EXTRACTION_CACHE_ENABLED
+        )
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @staticmethod
+    def make_key(content_hash: str, prompt_version: str, model_name: str) -> str:
+        """Cache key for an extraction"""
+        return f"{content_hash}:{prompt_version}:{model_name}"
+
+    async def get(self, key: str) -> Optional[ExtractedData]:
+        """Cached extraction for key, or None when missing or expired"""
+        raw = await self.store.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+
+        try:
+            entry = json.loads(raw)
+            if time.time() - entry["created_at"] > settings.EXTRACTION_CACHE_TTL:
+                self.expired += 1
+                self.misses += 1
+                return None
+            data = ExtractedData(**entry["data"])
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable extraction cache entry: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    async def put(self, key: str, data: ExtractedData) -> None:
+        """Store an extraction result"""
+        entry = {"created_at": time.time(), "data": data.dict()}
+        await self.store.put(key, json.dumps(entry).encode())
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for this process"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.store.evictions
+        }
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of file bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+# Create global instance
+extraction_cache = ExtractionCache()
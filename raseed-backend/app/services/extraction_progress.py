@@ -0,0 +1,83 @@
+# app/services/extraction_progress.py
+from pydantic import ValidationError
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.models.receipt import ExtractedData, ReceiptUpdate
+from app.services.partial_json import IncrementalJSONParser
+from app.services.processing_lease import processing_lease
+
+logger = logging.getLogger(__name__)
+
+# Fields worth showing the moment they arrive
+HEADER_FIELDS = {"merchant_name", "receipt_date", "total_amount"}
+
+class ExtractionProgress:
+    """Saves partial extraction results to a receipt while Gemini streams
+
+    Header fields are written as soon as they are complete; items are
+    appended at most every AI_PARTIAL_SAVE_INTERVAL seconds. The receipt
+    keeps its PROCESSING status until the final result is stored. With a
+    lease_job_id, saving stops once that job no longer holds the
+    receipt's processing lease.
+    """
+
+    def __init__(self, receipt_id: str, lease_job_id: Optional[str] = None):
+        self.receipt_id = receipt_id
+        self.lease_job_id = lease_job_id
+        self.lease_lost = False
+        self.saves = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over, e.g. when a failed stream is retried"""
+        self.parser = IncrementalJSONParser(stream_arrays={"items"})
+        self.fields: Dict[str, Any] = {}
+        self.items: List[Any] = []
+        self.dirty = False
+        self.last_save = 0.0
+
+    async def feed(self, text: str) -> None:
+        """Parse a streamed chunk and save whatever it completed"""
+        try:
+            events = self.parser.feed(text)
+        except ValueError as e:
+            # Not a JSON object after all; final validation reports it
+            logger.warning(f"⚠️ Stopped parsing streamed response: {e}")
+            self.parser.done = True
+            return
+
+        header_arrived = False
+        for kind, key, value in events:
+            if kind == "item":
+                self.items.append(value)
+            else:
+                self.fields[key] = value
+                header_arrived = header_arrived or key in HEADER_FIELDS
+            self.dirty = True
+
+        if self.dirty and (header_arrived or time.monotonic() - self.last_save >= settings.AI_PARTIAL_SAVE_INTERVAL):
+            await self.save()
+
+    async def save(self) -> None:
+        """Write the partial result to the receipt document"""
+        from app.services.receipt_service import ReceiptService
+
+        try:
+            partial = ExtractedData(**{**self.fields, "items": self.items})
+        except (ValidationError, TypeError):
+            return
+
+        self.dirty = False
+        self.last_save = time.monotonic()
+        if self.lease_lost:
+            return
+        if self.lease_job_id and not await processing_lease.holds(self.receipt_id, self.lease_job_id):
+            self.lease_lost = True
+            logger.warning(f"🔒 Lost the processing lease for receipt {self.receipt_id}, no more partial saves")
+            return
+        if await ReceiptService.update_receipt(self.receipt_id, ReceiptUpdate(extracted_data=partial)):
+            self.saves += 1
+            logger.info(f"💾 Saved partial extraction for {self.receipt_id}: {len(self.items)} items so far")
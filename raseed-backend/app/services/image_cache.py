@@ -0,0 +1,11 @@
+# app/services/image_cache.py
+from app.core.config import settings
+from app.core.disk_cache import DiskLRUCache
+
+# Receipt image bytes keyed by stored_filename, shared by all local workers
+image_cache = DiskLRUCache(
+    "Image",
+    settings.IMAGE_CACHE_DIR,
+    settings.IMAGE_CACHE_MAX_BYTES,
+    enabled=settings.IMAGE_CACHE_ENABLED
+)
@@ -0,0 +1,168 @@
+# app/services/image_quality.py
+from PIL import Image
+import numpy as np
+from typing import List
+
+from app.core.config import settings
+from app.models.receipt import ImageQualityReport
+from app.services.video_service import laplacian_variance, text_density
+
+# Gray level step that counts as an edge, as in text_density
+EDGE_THRESHOLD = 40
+
+# Gray level from which a pixel counts as blown out
+GLARE_LEVEL = 250
+
+# Gray level spread below which the photo shows nothing at all; blurred
+# receipts keep most of the spread of their text lines
+FLAT_CONTRAST = 5.0
+
+# Share of edge rows / columns ignored at each end of the text area, so
+# stray edges (noise, table texture) don't stretch it
+TEXT_AREA_TRIM = 0.01
+
+# Tile size, in analysis pixels, used to find the paper level around text
+TEXT_TILE = 16
+
+# Share of the height / width checked for text running off each side
+BORDER_SHARE = 0.03
+
+BLURRY = "The photo is blurry. Hold the camera steady and tap the receipt to focus before taking it."
+TOO_DARK = "The photo is too dark. Retake it in better light or turn on the flash."
+NO_TEXT = "No receipt text was found. Make sure the receipt is in the photo and fills most of it."
+GLARE = "Glare is washing out part of the receipt. Tilt it or move away from direct light."
+LOW_CONTRAST = "The receipt looks faded or low in contrast, so some values may be misread."
+CUT_OFF = "The receipt seems cut off at the {sides}. Make sure the whole receipt is in the photo."
+
+class ImageQualityError(Exception):
+    """Raised instead of sending an image that failed the quality gate to the AI"""
+
+    def __init__(self, report: ImageQualityReport):
+        super().__init__(" ".join(report.issues))
+        self.report = report
+
+def analysis_gray(image: Image.Image) -> np.ndarray:
+    """Grayscale copy of the image, box-downscaled to about IMAGE_QUALITY_ANALYSIS_WIDTH"""
+    factor = round(image.width / settings.IMAGE_QUALITY_ANALYSIS_WIDTH)
+    if factor > 1:
+        image = image.reduce(factor)
+    return np.asarray(image.convert("L"))
+
+def edge_mask(gray: np.ndarray) -> np.ndarray:
+    """Horizontal steps of at least EDGE_THRESHOLD, as in text_density"""
+    return np.abs(np.diff(gray.astype(np.int16), axis=1)) > EDGE_THRESHOLD
+
+def text_area(gray: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Bounding box of the text-like edges, the whole image when there are none"""
+    rows = np.flatnonzero(edges.any(axis=1))
+    columns = np.flatnonzero(edges.any(axis=0))
+    if rows.size == 0:
+        return gray
+    top, bottom = np.quantile(rows, [TEXT_AREA_TRIM, 1 - TEXT_AREA_TRIM]).astype(int)
+    left, right = np.quantile(columns, [TEXT_AREA_TRIM, 1 - TEXT_AREA_TRIM]).astype(int)
+    return gray[top:bottom + 1, left:right + 2]
+
+def paper_level(gray: np.ndarray, edges: np.ndarray) -> float:
+    """Typical gray level of the paper around the text
+
+    Median over the TEXT_TILE tiles that contain edges of each tile's
+    median; text covers too little of a tile to move it. Glare patches
+    wash the text out, so their tiles don't count.
+    """
+    rows = gray.shape[0] // TEXT_TILE * TEXT_TILE
+    columns = edges.shape[1] // TEXT_TILE * TEXT_TILE
+    if not rows or not columns:
+        return float(np.median(gray))
+
+    def tiles(values: np.ndarray) -> np.ndarray:
+        return values[:rows, :columns].reshape(rows // TEXT_TILE, TEXT_TILE, columns // TEXT_TILE, TEXT_TILE).swapaxes(1, 2)
+
+    has_text = tiles(edges).any(axis=(2, 3))
+    if not has_text.any():
+        return float(np.median(gray))
+    medians = np.median(tiles(gray).reshape(*has_text.shape, -1), axis=2)
+    return float(np.median(medians[has_text]))
+
+def glare_share(area: np.ndarray, paper: float) -> float:
+    """Share of blown-out pixels in the text area
+
+    Zero when the paper itself is at that level: scans and e-receipts
+    have a pure white background, and an evenly overexposed photo with
+    readable text isn't glare.
+    """
+    if paper >= GLARE_LEVEL:
+        return 0.0
+    return float((area >= GLARE_LEVEL).mean())
+
+def cut_off_sides(gray: np.ndarray) -> List[str]:
+    """Sides where text runs into the image border
+
+    A border strip counts when it has at least half the edge density of
+    the whole image. Edges are taken across the strip (horizontal steps
+    at top and bottom, vertical steps at the sides), so the straight
+    edge of the paper itself doesn't count.
+    """
+    gray = gray.astype(np.int16)
+    across_rows = np.abs(np.diff(gray, axis=1)) > EDGE_THRESHOLD
+    across_columns = np.abs(np.diff(gray, axis=0)) > EDGE_THRESHOLD
+    rows = max(2, int(BORDER_SHARE * gray.shape[0]))
+    columns = max(2, int(BORDER_SHARE * gray.shape[1]))
+
+    strips = {
+        "top": (across_rows[:rows], across_rows),
+        "bottom": (across_rows[-rows:], across_rows),
+        "left": (across_columns[:, :columns], across_columns),
+        "right": (across_columns[:, -columns:], across_columns),
+    }
+    sides = []
+    for side, (strip, edges) in strips.items():
+        density = edges.mean()
+        if density > 0 and strip.mean() >= 0.5 * density:
+            sides.append(side)
+    return sides
+
+def assess_image(image: Image.Image) -> ImageQualityReport:
+    """Check sharpness, exposure and framing of a receipt photo (blocking, a few ms)
+
+    Blurry, dark or text-less images are issues that stop the AI call
+    (warnings instead when IMAGE_QUALITY_REJECT is off); glare, low
+    contrast and text cut off at the border are warnings. Contrast and
+    glare are measured in the text area only.
+    """
+    gray = analysis_gray(image)
+    edges = edge_mask(gray)
+    area = text_area(gray, edges)
+    report = ImageQualityReport(
+        sharpness=round(laplacian_variance(gray), 1),
+        brightness=round(float(gray.mean()), 1),
+        contrast=round(float(area.std()), 1),
+        glare=round(glare_share(area, paper_level(gray, edges)), 3),
+        text_density=round(text_density(gray, EDGE_THRESHOLD), 4)
+    )
+
+    issues: List[str] = []
+    if report.brightness < settings.IMAGE_QUALITY_MIN_BRIGHTNESS:
+        issues.append(TOO_DARK)
+    elif gray.std() < FLAT_CONTRAST:
+        issues.append(NO_TEXT)  # flat image, nothing to focus on
+    elif report.sharpness < settings.IMAGE_QUALITY_MIN_SHARPNESS:
+        issues.append(BLURRY)
+    elif report.text_density < settings.IMAGE_QUALITY_MIN_TEXT_DENSITY:
+        issues.append(NO_TEXT)
+
+    warnings: List[str] = []
+    if report.glare > settings.IMAGE_QUALITY_MAX_GLARE:
+        warnings.append(GLARE)
+    if not issues and report.contrast < settings.IMAGE_QUALITY_MIN_CONTRAST:
+        warnings.append(LOW_CONTRAST)
+    if not issues:
+        sides = cut_off_sides(gray)
+        if sides:
+            warnings.append(CUT_OFF.format(sides=" and ".join(sides)))
+
+    if settings.IMAGE_QUALITY_REJECT:
+        report.issues = issues
+        report.warnings = warnings
+    else:
+        report.warnings = issues + warnings
+    return report
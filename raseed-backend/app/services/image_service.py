@@ -0,0 +1,85 @@
+# app/services/image_service.py
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+import asyncio
+import io
+import logging
+from typing import Dict, Optional, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def encode_jpeg(image: Image.Image, max_dimension: int, quality: int) -> bytes:
+    """Downscale image to fit max_dimension and encode it as JPEG"""
+    image = image.copy()
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+def generate_derivatives(source: Union[bytes, str], ai_max_dimension: int, thumbnail_max_dimension: int) -> Dict[str, bytes]:
+    """Normalize an uploaded image and build its derivatives
+
+    Runs in a worker process. source is the image bytes or the path of a
+    file holding them. Returns JPEG bytes keyed by derivative name
+    ("ai_input", "thumbnail").
+    """
+    image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+
+    # Let the JPEG decoder skip detail we are going to throw away anyway
+    image.draft("RGB", (ai_max_dimension, ai_max_dimension))
+
+    # Apply EXIF rotation so derivatives are upright
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    ai_input = encode_jpeg(image, ai_max_dimension, settings.AI_IMAGE_QUALITY)
+    thumbnail = encode_jpeg(image, thumbnail_max_dimension, settings.THUMBNAIL_QUALITY)
+
+    return {"ai_input": ai_input, "thumbnail": thumbnail}
+
+class ImageService:
+    """Upload-time image normalization running in a process pool"""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """Get (lazily create) the image worker pool"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+        return self._executor
+
+    @staticmethod
+    def derivative_filename(stored_filename: str, name: str) -> str:
+        """Storage path of a derivative, e.g. receipts/x.png -> receipts/x_thumbnail.jpg"""
+        stem = stored_filename.rsplit('.', 1)[0]
+        return f"{stem}_{name}.jpg"
+
+    async def create_derivatives(self, source: Union[bytes, str]) -> Optional[Dict[str, bytes]]:
+        """Build derivatives (from bytes or a file path) off the event loop; None if the image can't be decoded"""
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.get_executor(),
+                generate_derivatives,
+                source,
+                settings.AI_IMAGE_MAX_DIMENSION,
+                settings.THUMBNAIL_MAX_DIMENSION
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not generate image derivatives: {e}")
+            return None
+
+    def shutdown(self) -> None:
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Create global instance
+image_service = ImageService()
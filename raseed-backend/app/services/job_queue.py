@@ -0,0 +1,329 @@
+# app/services/job_queue.py
+from collections import OrderedDict, deque
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.fair_share import WAIT_SAMPLES, WeightedRoundRobin, current_lane, wait_summary
+from app.models.receipt import (
+    ReceiptResponse, ReceiptUpdate, ReceiptStatus, ProcessingJob, ProcessingLane, JobState
+)
+from app.services.processing_lease import processing_lease
+
+logger = logging.getLogger(__name__)
+
+def bulk_worker_limit() -> int:
+    """Most workers bulk jobs may occupy at once"""
+    return max(1, settings.PROCESSING_WORKERS - settings.INTERACTIVE_RESERVED_WORKERS)
+
+class JobQueue:
+    """In-process queue of receipt extraction jobs
+
+    Jobs run on PROCESSING_WORKERS asyncio worker tasks so slow LLM calls
+    never hold a request handler. Each priority lane has its own queue;
+    free workers choose between lanes by LANE_WEIGHTS, and bulk jobs never
+    occupy the last INTERACTIVE_RESERVED_WORKERS workers. Job state lives
+    in this process only; the receipt document in Firestore remains the
+    source of truth for status.
+    """
+
+    def __init__(self):
+        self._ready: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, ProcessingJob]" = OrderedDict()
+        self._lanes: Dict[ProcessingLane, Deque[str]] = {lane: deque() for lane in ProcessingLane}  # job ids waiting, in order
+        self._running: Dict[ProcessingLane, int] = {lane: 0 for lane in ProcessingLane}
+        self._completed: Dict[ProcessingLane, int] = {lane: 0 for lane in ProcessingLane}
+        self._waits: Dict[ProcessingLane, Deque[float]] = {
+            lane: deque(maxlen=WAIT_SAMPLES) for lane in ProcessingLane
+        }
+        self._picker = WeightedRoundRobin(settings.LANE_WEIGHTS)
+        self._active_by_receipt: Dict[str, str] = {}  # receipt id -> queued/running job id
+        self._job_args: Dict[str, Dict[str, Any]] = {}
+        self._heartbeats: Dict[str, asyncio.Task] = {}  # job id -> lease renewal task
+
+    async def start(self) -> None:
+        """Start the worker tasks"""
+        if self._workers:
+            return
+        self._ready = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(settings.PROCESSING_WORKERS)
+        ]
+        logger.info(f"✅ Processing queue started with {settings.PROCESSING_WORKERS} workers")
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks and hand unfinished jobs back
+
+        Receipts of queued and running jobs go back to UPLOADED and their
+        leases are released, so they don't stay PROCESSING until someone
+        reprocesses them.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        heartbeats = list(self._heartbeats.values())
+        for heartbeat in heartbeats:
+            heartbeat.cancel()
+        await asyncio.gather(*heartbeats, return_exceptions=True)
+        self._heartbeats.clear()
+
+        # Running jobs were handed back by their workers on cancellation
+        queued = [job for job in self._jobs.values() if job.state == JobState.QUEUED]
+        for job in queued:
+            self._stopped(job)
+        await asyncio.gather(*(self._hand_back(job) for job in queued), return_exceptions=True)
+        await asyncio.gather(*(processing_lease.release(job.receipt_id, job.job_id) for job in queued))
+
+        for lane in ProcessingLane:
+            self._lanes[lane].clear()
+        self._job_args.clear()
+        if self._ready:
+            async with self._ready:
+                self._ready.notify_all()
+
+    @staticmethod
+    def extraction_args(receipt: ReceiptResponse) -> Dict[str, Any]:
+        """Arguments for process_receipt_async: prefer the small AI input derivative"""
+        file_metadata = receipt.file_metadata
+        if file_metadata.ai_input_url:
+            return {
+                "image_url": file_metadata.ai_input_url,
+                "cache_key": file_metadata.ai_input_filename
+            }
+        return {
+            "image_url": receipt.download_url,
+            "content_type": file_metadata.content_type,
+            "cache_key": file_metadata.stored_filename
+        }
+
+    async def enqueue(
+        self,
+        receipt: ReceiptResponse,
+        use_cache: bool = True,
+        lane: ProcessingLane = ProcessingLane.INTERACTIVE
+    ) -> Optional[ProcessingJob]:
+        """Queue a receipt for extraction and mark it PROCESSING
+
+        Returns the already active job of this process if there is one, or
+        None when another worker holds the receipt's processing lease.
+        """
+        from app.services.receipt_service import ReceiptService
+
+        await self.start()
+
+        active_id = self._active_by_receipt.get(receipt.id)
+        if active_id:
+            return self._jobs[active_id]
+
+        job = ProcessingJob(
+            job_id=uuid.uuid4().hex,
+            receipt_id=receipt.id,
+            state=JobState.QUEUED,
+            lane=lane,
+            created_at=datetime.utcnow()
+        )
+        # Register before awaiting the lease so concurrent requests coalesce onto this job
+        self._active_by_receipt[receipt.id] = job.job_id
+        self._jobs[job.job_id] = job
+
+        leased = False
+        try:
+            leased = await processing_lease.acquire(receipt.id, job.job_id)
+        finally:
+            if not leased:
+                del self._active_by_receipt[receipt.id]
+                del self._jobs[job.job_id]
+        if not leased:
+            return None
+
+        await ReceiptService.update_receipt(receipt.id, ReceiptUpdate(status=ReceiptStatus.PROCESSING))
+
+        self._job_args[job.job_id] = {
+            **self.extraction_args(receipt),
+            "use_cache": use_cache,
+            # Bulk jobs can wait briefly to share a Gemini request; interactive ones stream
+            "batch": lane == ProcessingLane.BULK
+        }
+        self._heartbeats[job.job_id] = asyncio.create_task(self._heartbeat(job))
+        self._prune()
+
+        async with self._ready:
+            self._lanes[lane].append(job.job_id)
+            self._ready.notify_all()
+        logger.info(f"📥 Queued receipt {receipt.id} as {lane.value} job {job.job_id}")
+        return job
+
+    async def wait(self, job: ProcessingJob) -> ProcessingJob:
+        """Wait until a job has completed or failed"""
+        async with self._ready:
+            await self._ready.wait_for(lambda: job.state in (JobState.COMPLETED, JobState.FAILED))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ProcessingJob]:
+        """Get a job by id"""
+        return self._jobs.get(job_id)
+
+    def get_latest_job(self, receipt_id: str) -> Optional[ProcessingJob]:
+        """Most recent job for a receipt"""
+        for job in reversed(self._jobs.values()):
+            if job.receipt_id == receipt_id:
+                return job
+        return None
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position among waiting jobs of the same lane, None once the job has started"""
+        job = self._jobs.get(job_id)
+        if not job or job.state != JobState.QUEUED:
+            return None
+        for position, queued_id in enumerate(self._lanes[job.lane], start=1):
+            if queued_id == job_id:
+                return position
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running jobs and recent queue waits per lane"""
+        return {
+            "queued": sum(len(queue) for queue in self._lanes.values()),
+            "running": sum(self._running.values()),
+            "workers": len(self._workers),
+            "lanes": {
+                lane.value: {
+                    "queued": len(self._lanes[lane]),
+                    "running": self._running[lane],
+                    "completed": self._completed[lane],
+                    **wait_summary(self._waits[lane])
+                }
+                for lane in ProcessingLane
+            }
+        }
+
+    def _pick_lane(self) -> Optional[ProcessingLane]:
+        """Lane the next free worker should serve, None if nothing is runnable"""
+        bulk_limit = bulk_worker_limit()
+        lanes = [
+            lane.value for lane, queue in self._lanes.items()
+            if queue and not (lane == ProcessingLane.BULK and self._running[lane] >= bulk_limit)
+        ]
+        if not lanes:
+            return None
+        return ProcessingLane(self._picker.pick(lanes))
+
+    async def _next_job(self) -> ProcessingJob:
+        """Wait until a lane has runnable work and claim its oldest job"""
+        async with self._ready:
+            while True:
+                lane = self._pick_lane()
+                if lane is not None:
+                    self._running[lane] += 1
+                    return self._jobs[self._lanes[lane].popleft()]
+                await self._ready.wait()
+
+    async def _worker(self, index: int) -> None:
+        """Run queued jobs one at a time"""
+        from app.services.ai_service import ai_service
+
+        while True:
+            job = await self._next_job()
+            job_id = job.job_id
+
+            job.state = JobState.RUNNING
+            job.started_at = datetime.utcnow()
+            self._waits[job.lane].append((job.started_at - job.created_at).total_seconds())
+
+            # Gemini slots are shared between lanes by weight as well
+            token = current_lane.set(job.lane.value)
+            try:
+                args = self._job_args.pop(job_id)
+                if not await processing_lease.holds(job.receipt_id, job_id):
+                    job.state = JobState.FAILED
+                    job.error = "Processing lease lost to another worker"
+                    logger.warning(f"🔒 Job {job_id} lost the lease for receipt {job.receipt_id} while queued")
+                    continue
+
+                extracted_data = await ai_service.process_receipt_async(
+                    job.receipt_id, lease_job_id=job_id, **args
+                )
+                if extracted_data:
+                    job.state = JobState.COMPLETED
+                else:
+                    job.state = JobState.FAILED
+                    job.error = "AI extraction failed"
+            except asyncio.CancelledError:
+                self._stopped(job)
+                await self._hand_back(job)
+                raise
+            except Exception as e:
+                logger.error(f"❌ Job {job_id} failed: {e}")
+                job.state = JobState.FAILED
+                job.error = str(e)
+            finally:
+                current_lane.reset(token)
+                job.finished_at = datetime.utcnow()
+                self._active_by_receipt.pop(job.receipt_id, None)
+                self._heartbeats.pop(job_id).cancel()
+                await processing_lease.release(job.receipt_id, job_id)
+
+                async with self._ready:
+                    self._running[job.lane] -= 1
+                    self._completed[job.lane] += 1
+                    self._ready.notify_all()
+
+    def _stopped(self, job: ProcessingJob) -> None:
+        """Mark a job cut short by shutdown"""
+        job.state = JobState.FAILED
+        job.error = "Processing stopped by server shutdown"
+        job.finished_at = datetime.utcnow()
+        self._active_by_receipt.pop(job.receipt_id, None)
+
+    async def _hand_back(self, job: ProcessingJob) -> None:
+        """Reset the receipt of an unfinished job to UPLOADED if the job still holds its lease
+
+        Partial results saved while streaming are dropped, and the error
+        tells clients to try again.
+        """
+        from app.services.receipt_service import ReceiptService
+
+        if await processing_lease.holds(job.receipt_id, job.job_id):
+            await ReceiptService.update_receipt(
+                job.receipt_id,
+                ReceiptUpdate(
+                    status=ReceiptStatus.UPLOADED,
+                    extracted_data=None,
+                    processing_error="Processing was interrupted by a server restart, please try again"
+                )
+            )
+            logger.info(f"↩️ Handed receipt {job.receipt_id} back after stopping job {job.job_id}")
+
+    async def _heartbeat(self, job: ProcessingJob) -> None:
+        """Renew the job's lease while it is queued or running
+
+        Stops once the lease is lost; the worker checks ownership again
+        before starting the job and before saving its result.
+        """
+        while True:
+            await asyncio.sleep(settings.PROCESSING_LEASE_SECONDS / 3)
+            if not await processing_lease.renew(job.receipt_id, job.job_id):
+                logger.warning(f"🔒 Job {job.job_id} lost the lease for receipt {job.receipt_id}")
+                return
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond PROCESSING_JOB_HISTORY"""
+        excess = len(self._jobs) - settings.PROCESSING_JOB_HISTORY
+        if excess <= 0:
+            return
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.state in (JobState.COMPLETED, JobState.FAILED)
+        ]
+        for job_id in finished[:excess]:
+            del self._jobs[job_id]
+
+# Create global instance
+processing_queue = JobQueue()
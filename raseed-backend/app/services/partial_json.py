@@ -0,0 +1,111 @@
+# app/services/partial_json.py
+import json
+from typing import Any, Iterable, List, Tuple
+
+INCOMPLETE = object()
+WHITESPACE = " \t\n\r"
+
+class IncrementalJSONParser:
+    """Parses a top-level JSON object while it is still being streamed
+
+    feed() returns ("field", key, value) events for every top-level field
+    whose value is complete. Arrays named in stream_arrays are reported
+    element by element as ("item", key, element) events instead, so long
+    lists become visible before they are closed. The complete document is
+    still validated separately once the stream ends.
+    """
+
+    def __init__(self, stream_arrays: Iterable[str] = ()):
+        self.stream_arrays = set(stream_arrays)
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.state = "start"
+        self.key = None
+        self.done = False
+
+    def _skip_whitespace(self, pos: int) -> int:
+        while pos < len(self.buffer) and self.buffer[pos] in WHITESPACE:
+            pos += 1
+        return pos
+
+    def _decode(self) -> Tuple[Any, int]:
+        """Decode the value at pos, or INCOMPLETE if more text is needed"""
+        try:
+            value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError:
+            return INCOMPLETE, self.pos
+
+        # A number is only complete once a delimiter follows it ("12" may become "12.99")
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if end >= len(self.buffer) or self.buffer[end] not in WHITESPACE + ",}]":
+                return INCOMPLETE, self.pos
+        return value, end
+
+    def feed(self, text: str) -> List[Tuple[str, str, Any]]:
+        """Add streamed text and return the events it completed"""
+        self.buffer += text
+        events: List[Tuple[str, str, Any]] = []
+
+        while not self.done:
+            self.pos = self._skip_whitespace(self.pos)
+            if self.pos >= len(self.buffer):
+                break
+            char = self.buffer[self.pos]
+
+            if self.state == "start":
+                if char != "{":
+                    raise ValueError("Expected a JSON object")
+                self.pos += 1
+                self.state = "key"
+
+            elif self.state == "key":
+                if char == ",":
+                    self.pos += 1
+                    continue
+                if char == "}":
+                    self.pos += 1
+                    self.done = True
+                    break
+
+                key, end = self._decode()
+                if key is INCOMPLETE:
+                    break
+                colon = self._skip_whitespace(end)
+                if colon >= len(self.buffer):
+                    break
+                if not isinstance(key, str) or self.buffer[colon] != ":":
+                    raise ValueError(f"Invalid JSON object key at position {self.pos}")
+                self.key = key
+                self.pos = colon + 1
+                self.state = "value"
+
+            elif self.state == "value":
+                if char == "[" and self.key in self.stream_arrays:
+                    self.pos += 1
+                    self.state = "array"
+                    continue
+
+                value, end = self._decode()
+                if value is INCOMPLETE:
+                    break
+                events.append(("field", self.key, value))
+                self.pos = end
+                self.state = "key"
+
+            elif self.state == "array":
+                if char == ",":
+                    self.pos += 1
+                    continue
+                if char == "]":
+                    self.pos += 1
+                    self.state = "key"
+                    continue
+
+                value, end = self._decode()
+                if value is INCOMPLETE:
+                    break
+                events.append(("item", self.key, value))
+                self.pos = end
+
+        return events
@@ -0,0 +1,141 @@
+# app/services/processing_lease.py
+from google.api_core import exceptions as google_exceptions
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.core.database import get_async_firestore_client
+from app.core.circuit_breaker import CircuitOpenError, firestore_breaker
+from app.core.adaptive_limit import firestore_limiter
+
+logger = logging.getLogger(__name__)
+
+class ProcessingLease:
+    """Firestore-backed lease so only one API worker processes a receipt at a time
+
+    Leases live in FIRESTORE_COLLECTION_PROCESSING_LEASES keyed by receipt
+    id and expire after PROCESSING_LEASE_SECONDS unless renewed, so a
+    crashed worker can't block a receipt for long. Claims use create() and last-update-time
+    preconditions, which makes them safe across processes and hosts.
+    """
+
+    def __init__(self):
+        self.instance = f"{socket.gethostname()}:{os.getpid()}"
+
+    def owner(self, job_id: str) -> str:
+        """Lease owner id for a job of this worker"""
+        return f"{self.instance}:{job_id}"
+
+    async def acquire(self, receipt_id: str, job_id: str) -> bool:
+        """Claim the receipt for job_id; False if another live lease holds it
+
+        Without Firestore only in-process coalescing applies, so the claim
+        succeeds. Firestore errors other than an open circuit also let the
+        claim through rather than blocking processing.
+        """
+        db = get_async_firestore_client()
+        if not db:
+            return True
+
+        ref = db.collection(settings.FIRESTORE_COLLECTION_PROCESSING_LEASES).document(receipt_id)
+        now = datetime.now(timezone.utc)
+        lease = {
+            "owner": self.owner(job_id),
+            "acquired_at": now,
+            "expires_at": now + timedelta(seconds=settings.PROCESSING_LEASE_SECONDS)
+        }
+
+        try:
+            async with firestore_breaker.guard(), firestore_limiter.guard("lease"):
+                snapshot = await ref.get()
+                if not snapshot.exists:
+                    await ref.create(lease)
+                    return True
+
+                current = snapshot.to_dict()
+                if current.get("expires_at") and current["expires_at"] > now:
+                    logger.info(f"🔒 Receipt {receipt_id} is leased by {current.get('owner')}")
+                    return False
+
+                # Take over the expired lease unless someone else just did
+                await ref.update(lease, option=db.write_option(last_update_time=snapshot.update_time))
+                return True
+
+        except (google_exceptions.AlreadyExists, google_exceptions.FailedPrecondition):
+            logger.info(f"🔒 Lost the race for receipt {receipt_id} lease")
+            return False
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Could not claim processing lease for {receipt_id}: {e}")
+            return True
+
+    async def renew(self, receipt_id: str, job_id: str) -> bool:
+        """Extend job_id's lease by PROCESSING_LEASE_SECONDS; False once it no longer holds it
+
+        Firestore errors count as renewed so a blip doesn't drop the job;
+        the next renewal or the ownership check before writing catches a
+        lease that really was lost.
+        """
+        db = get_async_firestore_client()
+        if not db:
+            return True
+
+        ref = db.collection(settings.FIRESTORE_COLLECTION_PROCESSING_LEASES).document(receipt_id)
+        try:
+            async with firestore_breaker.guard(), firestore_limiter.guard("lease"):
+                snapshot = await ref.get()
+                if not snapshot.exists or snapshot.to_dict().get("owner") != self.owner(job_id):
+                    return False
+                expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.PROCESSING_LEASE_SECONDS)
+                await ref.update(
+                    {"expires_at": expires_at},
+                    option=db.write_option(last_update_time=snapshot.update_time)
+                )
+                return True
+
+        except google_exceptions.FailedPrecondition:
+            return False
+        except Exception as e:
+            logger.warning(f"⚠️ Could not renew processing lease for {receipt_id}: {e}")
+            return True
+
+    async def holds(self, receipt_id: str, job_id: str) -> bool:
+        """Whether job_id still owns the receipt's lease
+
+        Like acquire, Firestore errors let the job through.
+        """
+        db = get_async_firestore_client()
+        if not db:
+            return True
+
+        ref = db.collection(settings.FIRESTORE_COLLECTION_PROCESSING_LEASES).document(receipt_id)
+        try:
+            async with firestore_breaker.guard(), firestore_limiter.guard("lease"):
+                snapshot = await ref.get()
+            return snapshot.exists and snapshot.to_dict().get("owner") == self.owner(job_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not check processing lease for {receipt_id}: {e}")
+            return True
+
+    async def release(self, receipt_id: str, job_id: str) -> None:
+        """Drop the lease if job_id still holds it"""
+        db = get_async_firestore_client()
+        if not db:
+            return
+
+        ref = db.collection(settings.FIRESTORE_COLLECTION_PROCESSING_LEASES).document(receipt_id)
+        try:
+            async with firestore_breaker.guard(), firestore_limiter.guard("lease"):
+                snapshot = await ref.get()
+                if not snapshot.exists or snapshot.to_dict().get("owner") != self.owner(job_id):
+                    return
+                await ref.delete(option=db.write_option(last_update_time=snapshot.update_time))
+        except Exception as e:
+            # The lease expires on its own
+            logger.warning(f"⚠️ Could not release processing lease for {receipt_id}: {e}")
+
+# Create global instance
+processing_lease = ProcessingLease()
@@ -1,39 +1,195 @@
 # app/services/receipt_service.py
 from fastapi import UploadFile, HTTPException
-from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+from typing import List, Optional, Tuple, Dict, Any
+import asyncio
+import io
+import os
+import tempfile
 import uuid
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta, timezone
 import logging
 
-from app.core.database import get_firestore_client, get_storage_bucket, is_firebase_initialized
+from google.api_core import exceptions as google_exceptions
+
+from app.core.database import get_async_firestore_client, get_storage_bucket, is_firebase_initialized
 from app.core.config import settings
+from app.core.circuit_breaker import CircuitOpenError, firestore_breaker, storage_breaker
+from app.core.adaptive_limit import firestore_limiter, storage_limiter
+from app.services.image_service import image_service
+from app.services.video_service import video_service
+from app.services.ai_service import ai_service
+from app.services.image_cache import image_cache
+from app.services.job_queue import processing_queue
 from app.models.receipt import (
-    ReceiptCreate, ReceiptUpdate, ReceiptResponse, ReceiptStatus,
-    FileMetadata, UploadResponse
+    ReceiptCreate, ReceiptUpdate, ReceiptResponse, ReceiptStatus, ProcessingLane, ExtractedData,
+    FileMetadata, UploadResponse, BatchUploadResult, BatchUploadResponse,
+    SignedUploadRequest, SignedUploadResponse, FinalizeUploadRequest
 )
 
 logger = logging.getLogger(__name__)
 
+# Content types that may be declared for each detected format
+CONTENT_TYPE_ALIASES = {
+    "image/jpeg": {"image/jpeg", "image/jpg"},
+    "image/png": {"image/png"},
+    "image/gif": {"image/gif"},
+    "image/webp": {"image/webp"},
+    "video/mp4": {"video/mp4"},
+    "video/webm": {"video/webm"},
+}
+
+# Major brands of ISO base media files that are MP4 video (HEIC, AVIF, QuickTime
+# and 3GP share the ftyp box but not these brands)
+MP4_BRANDS = {
+    b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"avc1",
+    b"dash", b"mmp4", b"MSNV", b"M4V ", b"M4VH", b"M4VP"
+}
+
 class ReceiptService:
     """Service class for receipt operations"""
     
     @staticmethod
-    def validate_file(file: UploadFile) -> bool:
-        """Validate uploaded file"""
-        if file.content_type not in settings.ALLOWED_FILE_TYPES:
+    def sniff_content_type(header: bytes) -> Optional[str]:
+        """Detect the real file format from its leading bytes"""
+        if header.startswith(b"\xff\xd8\xff"):
+            return "image/jpeg"
+        if header.startswith(b"\x89PNG\r\n\x1a\n"):
+            return "image/png"
+        if header[:6] in (b"GIF87a", b"GIF89a"):
+            return "image/gif"
+        if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+            return "image/webp"
+        if header[4:8] == b"ftyp" and header[8:12] in MP4_BRANDS:
+            return "video/mp4"
+        if header.startswith(b"\x1a\x45\xdf\xa3"):
+            return "video/webm"
+        return None
+    
+    @staticmethod
+    def check_content_type(declared: Optional[str], header: bytes) -> str:
+        """Check that the declared type is allowed and matches the file signature"""
+        if declared not in settings.ALLOWED_FILE_TYPES:
             raise HTTPException(
                 status_code=400,
                 detail=f"Invalid file type. Allowed types: {', '.join(settings.ALLOWED_FILE_TYPES)}"
             )
         
-        if file.size and file.size > settings.MAX_FILE_SIZE:
+        detected = ReceiptService.sniff_content_type(header)
+        if not detected or declared not in CONTENT_TYPE_ALIASES[detected]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File content does not match declared type {declared}"
+            )
+        
+        return detected
+    
+    @staticmethod
+    def check_image_dimensions(fp: Any, require_readable: bool = True) -> None:
+        """Check image dimensions from the header without decoding pixels"""
+        try:
+            with Image.open(fp) as image:
+                width, height = image.size
+        except Exception:
+            if not require_readable:
+                return
+            raise HTTPException(status_code=400, detail="File is not a readable image")
+        
+        if width * height > settings.MAX_IMAGE_PIXELS:
             raise HTTPException(
                 status_code=400,
-                detail=f"File size must be less than {settings.MAX_FILE_SIZE // (1024*1024)}MB"
+                detail=f"Image is too large ({width}x{height}). Maximum {settings.MAX_IMAGE_PIXELS // 1_000_000} megapixels"
             )
+    
+    @staticmethod
+    async def validate_file(file: UploadFile) -> bool:
+        """Validate uploaded file from its size, signature and image header
+
+        Only the first SNIFF_BYTES are read, so bad payloads are rejected
+        before they are hashed or uploaded. The file is rewound afterwards.
+        """
+        if file.content_type not in settings.ALLOWED_FILE_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type. Allowed types: {', '.join(settings.ALLOWED_FILE_TYPES)}"
+            )
+        
+        file_size = file.size
+        if file_size is None:
+            # Size of the spooled upload, without reading it
+            file_size = await run_in_threadpool(file.file.seek, 0, io.SEEK_END)
+        if file_size > settings.MAX_FILE_SIZE:
+            raise ReceiptService.file_too_large_error()
         
+        await file.seek(0)
+        header = await file.read(settings.SNIFF_BYTES)
+        detected = ReceiptService.check_content_type(file.content_type, header)
+        
+        if detected.startswith("image/"):
+            await file.seek(0)
+            await run_in_threadpool(ReceiptService.check_image_dimensions, file.file)
+        
+        await file.seek(0)
         return True
     
+    @staticmethod
+    def file_too_large_error() -> HTTPException:
+        """Error raised when a file exceeds MAX_FILE_SIZE"""
+        return HTTPException(
+            status_code=400,
+            detail=f"File size must be less than {settings.MAX_FILE_SIZE // (1024*1024)}MB"
+        )
+    
+    @staticmethod
+    async def compute_file_hash(file: UploadFile) -> Tuple[str, int]:
+        """Compute SHA-256 of the file in chunks and rewind it
+
+        Returns the hex digest and the file size in bytes.
+        """
+        sha256 = hashlib.sha256()
+        file_size = 0
+        
+        while True:
+            chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            
+            file_size += len(chunk)
+            if file_size > settings.MAX_FILE_SIZE:
+                raise ReceiptService.file_too_large_error()
+            
+            sha256.update(chunk)
+        
+        await file.seek(0)
+        return sha256.hexdigest(), file_size
+    
+    @staticmethod
+    async def find_receipt_by_hash(content_hash: str) -> Optional[Dict[str, Any]]:
+        """Look up an already uploaded receipt in the hash index"""
+        db = get_async_firestore_client()
+        if not db:
+            return None
+        
+        async with firestore_breaker.guard(), firestore_limiter.guard("read"):
+            doc = await db.collection(settings.FIRESTORE_COLLECTION_RECEIPT_HASHES).document(content_hash).get()
+        return doc.to_dict() if doc.exists else None
+    
+    @staticmethod
+    async def save_receipt_hash(content_hash: str, receipt_id: str, download_url: str) -> None:
+        """Record a receipt in the hash index"""
+        db = get_async_firestore_client()
+        if not db:
+            return
+        
+        async with firestore_breaker.guard(), firestore_limiter.guard("write"):
+            await db.collection(settings.FIRESTORE_COLLECTION_RECEIPT_HASHES).document(content_hash).set({
+                "receipt_id": receipt_id,
+                "download_url": download_url,
+                "created_at": datetime.utcnow()
+            })
+    
     @staticmethod
     def generate_unique_filename(original_filename: str) -> str:
         """Generate unique filename"""
@@ -43,8 +199,11 @@ class ReceiptService:
         return f"receipts/{timestamp}_{unique_id}.{file_extension}"
     
     @staticmethod
-    async def upload_to_storage(file: UploadFile, filename: str) -> str:
-        """Upload file to Firebase Storage"""
+    async def upload_to_storage(file: UploadFile, filename: str) -> Tuple[str, int]:
+        """Stream file to Firebase Storage in fixed-size chunks (resumable upload)
+
+        Returns the public URL and the number of bytes written.
+        """
         if not is_firebase_initialized():
             raise HTTPException(
                 status_code=500,
@@ -56,20 +215,168 @@ class ReceiptService:
             if not bucket:
                 raise HTTPException(status_code=500, detail="Storage bucket not available")
             
-            # Read file content
-            file_content = await file.read()
-            
-            # Upload to storage
-            blob = bucket.blob(filename)
-            blob.upload_from_string(file_content, content_type=file.content_type)
-            blob.make_public()
+            async with storage_breaker.guard(), storage_limiter.guard("upload") as call:
+                # Open a resumable upload session; blocking calls run off the event loop
+                blob = bucket.blob(filename)
+                writer = await run_in_threadpool(
+                    blob.open,
+                    "wb",
+                    chunk_size=settings.UPLOAD_CHUNK_SIZE,
+                    content_type=file.content_type
+                )
+                
+                bytes_written = 0
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    
+                    bytes_written += len(chunk)
+                    if bytes_written > settings.MAX_FILE_SIZE:
+                        # The session is never finalized, so no object is created
+                        raise ReceiptService.file_too_large_error()
+                    
+                    await run_in_threadpool(writer.write, chunk)
+                
+                await run_in_threadpool(writer.close)
+                await run_in_threadpool(blob.make_public)
+                call.sized(bytes_written)
             
-            return blob.public_url
+            return blob.public_url, bytes_written
             
+        except (HTTPException, CircuitOpenError):
+            raise
         except Exception as e:
             logger.error(f"Storage upload error: {e}")
             raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
     
+    @staticmethod
+    async def run_storage_call(fn: Any, *args: Any, kind: str = "metadata", **kwargs: Any) -> Any:
+        """Run a blocking Storage client call off the event loop under the Storage breaker and limiter"""
+        async with storage_breaker.guard(), storage_limiter.guard(kind):
+            return await run_in_threadpool(fn, *args, **kwargs)
+    
+    @staticmethod
+    async def spool_to_temp_file(file: UploadFile) -> str:
+        """Copy an upload to a named temp file in chunks and return its path
+
+        Keeps memory bounded and lets worker processes open the file instead
+        of receiving its bytes. The caller deletes the file.
+        """
+        await file.seek(0)
+        suffix = os.path.splitext(file.filename or "")[1]
+        spool = await run_in_threadpool(tempfile.NamedTemporaryFile, suffix=suffix, delete=False)
+        try:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await run_in_threadpool(spool.write, chunk)
+        finally:
+            await run_in_threadpool(spool.close)
+            await file.seek(0)
+        return spool.name
+    
+    @staticmethod
+    async def download_to_temp_file(blob: Any, suffix: str = "") -> str:
+        """Download a stored object to a named temp file and return its path
+
+        The caller deletes the file.
+        """
+        spool = await run_in_threadpool(tempfile.NamedTemporaryFile, suffix=suffix, delete=False)
+        await run_in_threadpool(spool.close)
+        try:
+            async with storage_breaker.guard(), storage_limiter.guard("download") as call:
+                call.sized(blob.size or 0)
+                await run_in_threadpool(blob.download_to_filename, spool.name)
+        except BaseException:
+            await run_in_threadpool(os.unlink, spool.name)
+            raise
+        return spool.name
+    
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """SHA-256 of a file, read in chunks (blocking)"""
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(settings.UPLOAD_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+    
+    @staticmethod
+    async def store_derivatives(file: UploadFile, stored_filename: str) -> Tuple[Dict[str, str], Optional[bytes]]:
+        """Generate and upload the derivatives of an upload (see store_file_derivatives)"""
+        if not file.content_type.startswith(("image/", "video/")):
+            return {}, None
+        
+        path = await ReceiptService.spool_to_temp_file(file)
+        try:
+            return await ReceiptService.store_file_derivatives(path, file.content_type, stored_filename)
+        finally:
+            await run_in_threadpool(os.unlink, path)
+    
+    @staticmethod
+    async def store_file_derivatives(path: str, content_type: str, stored_filename: str) -> Tuple[Dict[str, str], Optional[bytes]]:
+        """Generate and upload the AI input and thumbnail derivatives of a local file
+
+        Videos are reduced to their sharpest frame first. Returns the
+        FileMetadata fields for the stored derivatives and the AI input JPEG
+        bytes. Derivatives are best-effort: files that can't be decoded or
+        derivatives that fail to upload are logged and left out, since the
+        original is already stored and processing falls back to it.
+        """
+        is_video = content_type.startswith("video/")
+        if not is_video and not content_type.startswith("image/"):
+            return {}, None
+        
+        bucket = get_storage_bucket()
+        if not bucket:
+            logger.warning("⚠️ Storage bucket not available, skipping derivatives")
+            return {}, None
+        
+        if is_video:
+            frames = await video_service.select_frames(path, max_frames=1)
+            derivatives = await image_service.create_derivatives(frames[0]) if frames else None
+        else:
+            derivatives = await image_service.create_derivatives(path)
+        
+        if not derivatives:
+            return {}, None
+        
+        fields = {}
+        for name, data in derivatives.items():
+            blob = bucket.blob(image_service.derivative_filename(stored_filename, name))
+            try:
+                async with storage_breaker.guard(), storage_limiter.guard("derivative") as call:
+                    call.sized(len(data))
+                    await run_in_threadpool(blob.upload_from_string, data, content_type="image/jpeg")
+                    await run_in_threadpool(blob.make_public)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not store {name} derivative of {stored_filename}: {e}")
+                continue
+            
+            fields[f"{name}_filename"] = blob.name
+            fields[f"{name}_url"] = blob.public_url
+        
+        # Warm the local cache so processing never downloads the AI input again
+        if "ai_input_filename" in fields:
+            await image_cache.put(fields["ai_input_filename"], derivatives["ai_input"])
+        
+        return fields, derivatives["ai_input"]
+    
+    @staticmethod
+    def build_receipt_document(receipt_data: ReceiptCreate) -> Dict[str, Any]:
+        """Build the Firestore document for a new receipt"""
+        return {
+            "file_metadata": receipt_data.file_metadata.dict(),
+            "download_url": receipt_data.download_url,
+            "status": ReceiptStatus.UPLOADED.value,
+            "extracted_data": None,
+            "processing_error": None,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }
+    
     @staticmethod
     async def create_receipt(receipt_data: ReceiptCreate) -> str:
         """Create receipt record in Firestore"""
@@ -78,53 +385,75 @@ class ReceiptService:
             return f"demo_{uuid.uuid4().hex[:8]}"
         
         try:
-            db = get_firestore_client()
+            db = get_async_firestore_client()
             if not db:
                 raise HTTPException(status_code=500, detail="Database not available")
             
             # Prepare document data
-            doc_data = {
-                "file_metadata": receipt_data.file_metadata.dict(),
-                "download_url": receipt_data.download_url,
-                "status": ReceiptStatus.UPLOADED.value,
-                "extracted_data": None,
-                "processing_error": None,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
+            doc_data = ReceiptService.build_receipt_document(receipt_data)
             
             # Save to Firestore
-            doc_ref = db.collection(settings.FIRESTORE_COLLECTION_RECEIPTS).add(doc_data)
+            async with firestore_breaker.guard(), firestore_limiter.guard("write"):
+                doc_ref = await db.collection(settings.FIRESTORE_COLLECTION_RECEIPTS).add(doc_data)
             receipt_id = doc_ref[1].id
             
             logger.info(f"Receipt created with ID: {receipt_id}")
             return receipt_id
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Firestore save error: {e}")
             raise HTTPException(status_code=500, detail=f"Database save failed: {str(e)}")
     
     @staticmethod
-    async def upload_receipt(file: UploadFile) -> UploadResponse:
-        """Main upload receipt method"""
+    async def upload_receipt(file: UploadFile, auto_process: bool = False) -> UploadResponse:
+        """Main upload receipt method
+
+        With auto_process the receipt is extracted right away as an
+        interactive job of the processing queue, and the result is awaited.
+        The AI input derivative is already in the local image cache, so it
+        isn't downloaded back from storage.
+        """
         try:
             # Validate file
-            ReceiptService.validate_file(file)
+            await ReceiptService.validate_file(file)
             
             # Generate unique filename
             unique_filename = ReceiptService.generate_unique_filename(file.filename)
             
             if is_firebase_initialized():
+                # Skip storage and AI work for files we have already seen
+                content_hash, file_size = await ReceiptService.compute_file_hash(file)
+                existing = await ReceiptService.find_receipt_by_hash(content_hash)
+                if existing:
+                    logger.info(f"Duplicate upload of receipt {existing['receipt_id']}")
+                    return UploadResponse(
+                        success=True,
+                        receipt_id=existing["receipt_id"],
+                        download_url=existing["download_url"],
+                        metadata={
+                            "filename": file.filename,
+                            "size": file_size,
+                            "type": file.content_type
+                        },
+                        message="Duplicate file - returning existing receipt",
+                        duplicate=True
+                    )
+                
                 # Upload to Firebase Storage
-                download_url = await ReceiptService.upload_to_storage(file, unique_filename)
+                download_url, file_size = await ReceiptService.upload_to_storage(file, unique_filename)
+                derivatives, _ = await ReceiptService.store_derivatives(file, unique_filename)
                 
                 # Create file metadata
                 file_metadata = FileMetadata(
                     original_filename=file.filename,
                     stored_filename=unique_filename,
-                    file_size=file.size,
+                    file_size=file_size,
                     content_type=file.content_type,
-                    upload_date=datetime.utcnow()
+                    upload_date=datetime.utcnow(),
+                    content_hash=content_hash,
+                    **derivatives
                 )
                 
                 # Create receipt record
@@ -134,6 +463,16 @@ class ReceiptService:
                 )
                 
                 receipt_id = await ReceiptService.create_receipt(receipt_create)
+                await ReceiptService.save_receipt_hash(content_hash, receipt_id, download_url)
+                
+                extracted_data = None
+                message = None
+                if auto_process:
+                    if ai_service.is_available():
+                        processed = await ReceiptService.process_and_wait(receipt_id)
+                        extracted_data, message = ReceiptService.processing_outcome(processed)
+                    else:
+                        message = "Receipt uploaded - AI service not available"
                 
                 return UploadResponse(
                     success=True,
@@ -141,9 +480,12 @@ class ReceiptService:
                     download_url=download_url,
                     metadata={
                         "filename": file.filename,
-                        "size": file.size,
-                        "type": file.content_type
-                    }
+                        "size": file_size,
+                        "type": file.content_type,
+                        "thumbnail_url": file_metadata.thumbnail_url
+                    },
+                    message=message,
+                    extracted_data=extracted_data
                 )
             else:
                 # Demo mode
@@ -160,12 +502,439 @@ class ReceiptService:
                     message="Demo mode - Firebase not configured"
                 )
                 
-        except HTTPException:
+        except (HTTPException, CircuitOpenError):
             raise
         except Exception as e:
             logger.error(f"Upload error: {e}")
             raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
     
+    @staticmethod
+    async def process_and_wait(receipt_id: str) -> Optional[ReceiptResponse]:
+        """Extract a receipt through the processing queue and wait for the job
+
+        Like /process, the job takes the processing lease and marks the
+        receipt PROCESSING, so concurrent requests share it. Returns the
+        receipt as stored after the job, None if no job could run.
+        """
+        receipt = await ReceiptService.get_receipt_by_id(receipt_id)
+        if not receipt:
+            return None
+        
+        job = await processing_queue.enqueue(receipt, lane=ProcessingLane.INTERACTIVE)
+        if job is None:
+            logger.info(f"🔒 Receipt {receipt_id} is being processed by another worker")
+            return None
+        await processing_queue.wait(job)
+        return await ReceiptService.get_receipt_by_id(receipt_id)
+    
+    @staticmethod
+    def processing_outcome(receipt: Optional[ReceiptResponse]) -> Tuple[Optional[ExtractedData], str]:
+        """Extracted data and upload message for an auto-processed receipt
+
+        The message carries the quality gate's feedback: why an image was
+        rejected, or what may affect an extracted result.
+        """
+        if receipt and receipt.status == ReceiptStatus.PROCESSED and receipt.extracted_data:
+            warnings = receipt.extracted_data.quality_warnings
+            return receipt.extracted_data, " ".join(["Receipt uploaded and processed.", *warnings])
+        
+        if receipt and receipt.processing_error:
+            return None, f"Receipt uploaded but AI extraction failed: {receipt.processing_error}"
+        return None, "Receipt uploaded but AI extraction failed"
+    
+    @staticmethod
+    async def upload_receipts(files: List[UploadFile]) -> BatchUploadResponse:
+        """Upload many receipts with bounded concurrency
+
+        Storage writes run concurrently (UPLOAD_MAX_CONCURRENCY at a time) and
+        all receipt documents are created in a single Firestore WriteBatch.
+        Failures are reported per file instead of failing the whole batch.
+        """
+        if len(files) > settings.MAX_FILES_PER_BATCH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many files. Maximum {settings.MAX_FILES_PER_BATCH} files per batch"
+            )
+        
+        results = [BatchUploadResult(filename=file.filename, success=False) for file in files]
+        
+        if not is_firebase_initialized():
+            # Demo mode
+            for result, file in zip(results, files):
+                try:
+                    response = await ReceiptService.upload_receipt(file)
+                    result.success = True
+                    result.receipt_id = response.receipt_id
+                    result.download_url = response.download_url
+                except HTTPException as e:
+                    result.error = e.detail
+            return ReceiptService._batch_response(results, message="Demo mode - Firebase not configured")
+        
+        semaphore = asyncio.Semaphore(settings.UPLOAD_MAX_CONCURRENCY)
+        pending: Dict[int, Tuple[ReceiptCreate, str]] = {}  # index -> (receipt, content hash)
+        first_by_hash: Dict[str, int] = {}  # content hash -> index of first file in this batch
+        in_batch_duplicates: Dict[int, int] = {}  # index -> index of the first identical file
+        
+        async def store(index: int, file: UploadFile) -> None:
+            result = results[index]
+            try:
+                await ReceiptService.validate_file(file)
+                
+                async with semaphore:
+                    content_hash, file_size = await ReceiptService.compute_file_hash(file)
+                    
+                    if content_hash in first_by_hash:
+                        in_batch_duplicates[index] = first_by_hash[content_hash]
+                        return
+                    first_by_hash[content_hash] = index
+                    
+                    existing = await ReceiptService.find_receipt_by_hash(content_hash)
+                    if existing:
+                        result.success = True
+                        result.duplicate = True
+                        result.receipt_id = existing["receipt_id"]
+                        result.download_url = existing["download_url"]
+                        return
+                    
+                    unique_filename = ReceiptService.generate_unique_filename(file.filename)
+                    download_url, file_size = await ReceiptService.upload_to_storage(file, unique_filename)
+                    derivatives, _ = await ReceiptService.store_derivatives(file, unique_filename)
+                
+                file_metadata = FileMetadata(
+                    original_filename=file.filename,
+                    stored_filename=unique_filename,
+                    file_size=file_size,
+                    content_type=file.content_type,
+                    upload_date=datetime.utcnow(),
+                    content_hash=content_hash,
+                    **derivatives
+                )
+                pending[index] = (
+                    ReceiptCreate(file_metadata=file_metadata, download_url=download_url),
+                    content_hash
+                )
+                result.download_url = download_url
+                
+            except HTTPException as e:
+                result.error = e.detail
+            except Exception as e:
+                logger.error(f"Batch upload error for {file.filename}: {e}")
+                result.error = f"Upload failed: {str(e)}"
+        
+        await asyncio.gather(*(store(index, file) for index, file in enumerate(files)))
+        
+        if pending:
+            try:
+                db = get_async_firestore_client()
+                if not db:
+                    raise HTTPException(status_code=500, detail="Database not available")
+                
+                batch = db.batch()
+                receipts = db.collection(settings.FIRESTORE_COLLECTION_RECEIPTS)
+                hashes = db.collection(settings.FIRESTORE_COLLECTION_RECEIPT_HASHES)
+                
+                for index, (receipt_create, content_hash) in pending.items():
+                    doc_ref = receipts.document()
+                    batch.set(doc_ref, ReceiptService.build_receipt_document(receipt_create))
+                    batch.set(hashes.document(content_hash), {
+                        "receipt_id": doc_ref.id,
+                        "download_url": receipt_create.download_url,
+                        "created_at": datetime.utcnow()
+                    })
+                    results[index].receipt_id = doc_ref.id
+                
+                async with firestore_breaker.guard(), firestore_limiter.guard("write"):
+                    await batch.commit()
+                
+                for index in pending:
+                    results[index].success = True
+                logger.info(f"Batch created {len(pending)} receipts")
+                
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                logger.error(f"Firestore batch save error: {detail}")
+                for index in pending:
+                    results[index].receipt_id = None
+                    results[index].error = f"Database save failed: {detail}"
+        
+        for index, first_index in in_batch_duplicates.items():
+            first = results[first_index]
+            result = results[index]
+            result.success = first.success
+            result.duplicate = first.success
+            result.receipt_id = first.receipt_id
+            result.download_url = first.download_url
+            result.error = first.error
+        
+        return ReceiptService._batch_response(results)
+    
+    @staticmethod
+    def _batch_response(results: List[BatchUploadResult], message: Optional[str] = None) -> BatchUploadResponse:
+        """Summarize per-file batch results"""
+        uploaded = sum(1 for result in results if result.success)
+        return BatchUploadResponse(
+            results=results,
+            uploaded=uploaded,
+            failed=len(results) - uploaded,
+            message=message
+        )
+    
+    @staticmethod
+    async def create_signed_upload(request: SignedUploadRequest) -> SignedUploadResponse:
+        """Issue a short-lived signed PUT URL for uploading directly to storage"""
+        if request.content_type not in settings.ALLOWED_FILE_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type. Allowed types: {', '.join(settings.ALLOWED_FILE_TYPES)}"
+            )
+        
+        if request.file_size and request.file_size > settings.MAX_FILE_SIZE:
+            raise ReceiptService.file_too_large_error()
+        
+        if not is_firebase_initialized():
+            raise HTTPException(status_code=500, detail="Firebase not configured")
+        
+        try:
+            bucket = get_storage_bucket()
+            if not bucket:
+                raise HTTPException(status_code=500, detail="Storage bucket not available")
+            
+            stored_filename = ReceiptService.generate_unique_filename(request.filename)
+            expiration = timedelta(seconds=settings.SIGNED_URL_EXPIRATION)
+            
+            # Storage rejects PUTs whose body falls outside this range
+            headers = {"x-goog-content-length-range": f"0,{settings.MAX_FILE_SIZE}"}
+            
+            blob = bucket.blob(stored_filename)
+            upload_url = await run_in_threadpool(
+                blob.generate_signed_url,
+                version="v4",
+                expiration=expiration,
+                method="PUT",
+                content_type=request.content_type,
+                headers=headers
+            )
+            expires_at = datetime.utcnow() + expiration
+            
+            # Record the issued name; finalize accepts only recorded uploads
+            db = get_async_firestore_client()
+            if not db:
+                raise HTTPException(status_code=500, detail="Firestore client not available")
+            
+            async with firestore_breaker.guard(), firestore_limiter.guard("write"):
+                await ReceiptService.signed_upload_ref(db, stored_filename).create({
+                    "stored_filename": stored_filename,
+                    "content_type": request.content_type,
+                    "expires_at": expires_at,
+                    "claimed_at": None,
+                    "receipt_id": None
+                })
+            
+            return SignedUploadResponse(
+                upload_url=upload_url,
+                stored_filename=stored_filename,
+                headers={"Content-Type": request.content_type, **headers},
+                expires_at=expires_at
+            )
+            
+        except (HTTPException, CircuitOpenError):
+            raise
+        except Exception as e:
+            logger.error(f"Signed URL error: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to create upload URL: {str(e)}")
+    
+    @staticmethod
+    def signed_upload_ref(db, stored_filename: str):
+        """Firestore record of an issued signed upload, keyed by a hash of its object name"""
+        doc_id = hashlib.sha256(stored_filename.encode()).hexdigest()
+        return db.collection(settings.FIRESTORE_COLLECTION_SIGNED_UPLOADS).document(doc_id)
+    
+    @staticmethod
+    async def claim_signed_upload(db, stored_filename: str) -> Tuple[Any, Dict[str, Any]]:
+        """Claim an issued upload for finalizing
+        
+        Returns the record's reference and data. The claim is a
+        last-update-time conditional write, so of two concurrent finalize
+        calls only one gets it; the other sees 409. Records that already
+        carry a receipt id are returned unclaimed.
+        """
+        ref = ReceiptService.signed_upload_ref(db, stored_filename)
+        now = datetime.now(timezone.utc)
+        
+        try:
+            async with firestore_breaker.guard(), firestore_limiter.guard("read"):
+                snapshot = await ref.get()
+            if not snapshot.exists:
+                raise HTTPException(status_code=400, detail="Unknown upload: request an upload URL first")
+            
+            upload = snapshot.to_dict()
+            if upload.get("receipt_id"):
+                return ref, upload
+            
+            claimed_at = upload.get("claimed_at")
+            if claimed_at and claimed_at > now - timedelta(seconds=settings.FINALIZE_CLAIM_SECONDS):
+                raise HTTPException(status_code=409, detail="Upload is already being finalized")
+            
+            async with firestore_breaker.guard(), firestore_limiter.guard("write"):
+                await ref.update(
+                    {"claimed_at": now},
+                    option=db.write_option(last_update_time=snapshot.update_time)
+                )
+            return ref, upload
+            
+        except google_exceptions.FailedPrecondition:
+            raise HTTPException(status_code=409, detail="Upload is already being finalized")
+    
+    @staticmethod
+    async def finalize_signed_upload(request: FinalizeUploadRequest) -> UploadResponse:
+        """Verify a direct upload and create its receipt record
+        
+        Only names issued by create_signed_upload are accepted, and each
+        is finalized once: repeated calls return the same receipt. Like
+        upload_receipt, files already uploaded return the existing receipt
+        (the new object is deleted), and derivatives are stored.
+        """
+        if not is_firebase_initialized():
+            raise HTTPException(status_code=500, detail="Firebase not configured")
+        
+        upload_ref = None
+        receipt_id = None
+        try:
+            bucket = get_storage_bucket()
+            if not bucket:
+                raise HTTPException(status_code=500, detail="Storage bucket not available")
+            
+            db = get_async_firestore_client()
+            if not db:
+                raise HTTPException(status_code=500, detail="Firestore client not available")
+            
+            ref, upload = await ReceiptService.claim_signed_upload(db, request.stored_filename)
+            if upload.get("receipt_id"):
+                return UploadResponse(
+                    success=True,
+                    receipt_id=upload["receipt_id"],
+                    download_url=upload.get("download_url"),
+                    metadata={
+                        "filename": request.original_filename,
+                        "size": upload.get("file_size"),
+                        "type": upload.get("content_type")
+                    },
+                    message="Upload already finalized",
+                    duplicate=True
+                )
+            upload_ref = ref
+            
+            blob = await ReceiptService.run_storage_call(bucket.get_blob, request.stored_filename)
+            if not blob:
+                raise HTTPException(status_code=404, detail="Uploaded file not found")
+            
+            metadata = {
+                "filename": request.original_filename,
+                "size": blob.size,
+                "type": blob.content_type
+            }
+            
+            if blob.size > settings.MAX_FILE_SIZE:
+                await ReceiptService.run_storage_call(blob.delete)
+                raise ReceiptService.file_too_large_error()
+            
+            # Only the leading bytes are fetched to verify the real type
+            header = await ReceiptService.run_storage_call(
+                blob.download_as_bytes, start=0, end=settings.SNIFF_BYTES - 1, kind="header"
+            )
+            try:
+                detected = ReceiptService.check_content_type(blob.content_type, header)
+                if detected.startswith("image/"):
+                    # The header may stop before the size marker (e.g. large EXIF blocks)
+                    ReceiptService.check_image_dimensions(io.BytesIO(header), require_readable=False)
+            except HTTPException:
+                await ReceiptService.run_storage_call(blob.delete)
+                raise
+            
+            # Same post-upload steps as upload_receipt, from a local copy of the object
+            path = await ReceiptService.download_to_temp_file(blob, os.path.splitext(request.stored_filename)[1])
+            try:
+                content_hash = await run_in_threadpool(ReceiptService.hash_file, path)
+                existing = await ReceiptService.find_receipt_by_hash(content_hash)
+                if existing:
+                    logger.info(f"Duplicate direct upload of receipt {existing['receipt_id']}")
+                    await ReceiptService.mark_signed_upload_finalized(
+                        upload_ref, existing["receipt_id"], existing["download_url"], blob
+                    )
+                    receipt_id = existing["receipt_id"]
+                    try:
+                        await ReceiptService.run_storage_call(blob.delete)
+                    except Exception as e:
+                        logger.warning(f"⚠️ Could not delete duplicate upload {request.stored_filename}: {e}")
+                    return UploadResponse(
+                        success=True,
+                        receipt_id=receipt_id,
+                        download_url=existing["download_url"],
+                        metadata=metadata,
+                        message="Duplicate file - returning existing receipt",
+                        duplicate=True
+                    )
+                
+                await ReceiptService.run_storage_call(blob.make_public)
+                derivatives, _ = await ReceiptService.store_file_derivatives(
+                    path, blob.content_type, request.stored_filename
+                )
+            finally:
+                await run_in_threadpool(os.unlink, path)
+            
+            file_metadata = FileMetadata(
+                original_filename=request.original_filename,
+                stored_filename=request.stored_filename,
+                file_size=blob.size,
+                content_type=blob.content_type,
+                upload_date=datetime.utcnow(),
+                content_hash=content_hash,
+                **derivatives
+            )
+            
+            receipt_id = await ReceiptService.create_receipt(
+                ReceiptCreate(file_metadata=file_metadata, download_url=blob.public_url)
+            )
+            await ReceiptService.save_receipt_hash(content_hash, receipt_id, blob.public_url)
+            await ReceiptService.mark_signed_upload_finalized(upload_ref, receipt_id, blob.public_url, blob)
+            
+            return UploadResponse(
+                success=True,
+                receipt_id=receipt_id,
+                download_url=blob.public_url,
+                metadata={**metadata, "thumbnail_url": file_metadata.thumbnail_url}
+            )
+            
+        except Exception as e:
+            # Let the client retry; once the receipt exists the claim stays held
+            if upload_ref is not None and receipt_id is None:
+                await ReceiptService.release_signed_upload(upload_ref)
+            if isinstance(e, (HTTPException, CircuitOpenError)):
+                raise
+            logger.error(f"Finalize upload error: {e}")
+            raise HTTPException(status_code=500, detail=f"Finalize failed: {str(e)}")
+    
+    @staticmethod
+    async def mark_signed_upload_finalized(ref, receipt_id: str, download_url: str, blob: Any) -> None:
+        """Record the receipt an issued upload was finalized into"""
+        async with firestore_breaker.guard(), firestore_limiter.guard("write"):
+            await ref.update({
+                "receipt_id": receipt_id,
+                "download_url": download_url,
+                "file_size": blob.size,
+                "content_type": blob.content_type,
+                "finalized_at": datetime.utcnow()
+            })
+    
+    @staticmethod
+    async def release_signed_upload(ref) -> None:
+        """Drop a finalize claim so the upload can be finalized again"""
+        try:
+            async with firestore_breaker.guard(), firestore_limiter.guard("write"):
+                await ref.update({"claimed_at": None})
+        except Exception as e:
+            logger.warning(f"⚠️ Could not release finalize claim: {e}")
+    
     @staticmethod
     async def get_receipts(limit: int = 10, offset: int = 0) -> List[ReceiptResponse]:
         """Get list of receipts"""
@@ -173,7 +942,7 @@ class ReceiptService:
             return []
         
         try:
-            db = get_firestore_client()
+            db = get_async_firestore_client()
             if not db:
                 return []
             
@@ -183,9 +952,11 @@ class ReceiptService:
                     .limit(limit)
                     .offset(offset))
             
-            docs = query.stream()
             receipts = []
             
+            async with firestore_breaker.guard(), firestore_limiter.guard("query"):
+                docs = [doc async for doc in query.stream()]
+            
             for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
@@ -201,6 +972,8 @@ class ReceiptService:
             
             return receipts
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Get receipts error: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to fetch receipts: {str(e)}")
@@ -212,12 +985,13 @@ class ReceiptService:
             return None
         
         try:
-            db = get_firestore_client()
+            db = get_async_firestore_client()
             if not db:
                 return None
             
             doc_ref = db.collection(settings.FIRESTORE_COLLECTION_RECEIPTS).document(receipt_id)
-            doc = doc_ref.get()
+            async with firestore_breaker.guard(), firestore_limiter.guard("read"):
+                doc = await doc_ref.get()
             
             if not doc.exists:
                 return None
@@ -233,18 +1007,24 @@ class ReceiptService:
             
             return ReceiptResponse(**data)
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Get receipt error: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to fetch receipt: {str(e)}")
     
     @staticmethod
     async def update_receipt(receipt_id: str, update_data: ReceiptUpdate) -> bool:
-        """Update receipt"""
+        """Update receipt
+
+        Fields left unset are kept; extracted_data or processing_error
+        explicitly set to None are cleared.
+        """
         if not is_firebase_initialized():
             return False
         
         try:
-            db = get_firestore_client()
+            db = get_async_firestore_client()
             if not db:
                 return False
             
@@ -253,16 +1033,21 @@ class ReceiptService:
             
             if update_data.extracted_data:
                 update_dict["extracted_data"] = update_data.extracted_data.dict()
+            elif "extracted_data" in update_data.model_fields_set:
+                update_dict["extracted_data"] = None
             
             if update_data.status:
                 update_dict["status"] = update_data.status.value
             
             if update_data.processing_error:
                 update_dict["processing_error"] = update_data.processing_error
+            elif "processing_error" in update_data.model_fields_set:
+                update_dict["processing_error"] = None
             
             # Update document
             doc_ref = db.collection(settings.FIRESTORE_COLLECTION_RECEIPTS).document(receipt_id)
-            doc_ref.update(update_dict)
+            async with firestore_breaker.guard(), firestore_limiter.guard("write"):
+                await doc_ref.update(update_dict)
             
             logger.info(f"Receipt {receipt_id} updated successfully")
             return True
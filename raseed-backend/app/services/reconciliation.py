@@ -0,0 +1,84 @@
+# app/services/reconciliation.py
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.receipt import ExtractedData
+
+# Rounding slack in currency units, on top of AI_RECONCILE_TOLERANCE
+MIN_TOLERANCE = 0.05
+
+def amounts_match(actual: float, expected: float) -> bool:
+    """Whether two amounts agree within the reconciliation tolerance"""
+    tolerance = max(MIN_TOLERANCE, settings.AI_RECONCILE_TOLERANCE * abs(expected))
+    return abs(actual - expected) <= tolerance
+
+def items_total(data: ExtractedData) -> Optional[float]:
+    """Sum of item totals, or None if any item is missing its price"""
+    if not data.items or any(item.total_price is None for item in data.items):
+        return None
+    return sum(item.total_price for item in data.items)
+
+def fix_locally(data: ExtractedData) -> Tuple[ExtractedData, int]:
+    """Fill in amounts that follow from the others
+
+    Missing line totals come from quantity x unit_price (and vice versa),
+    a missing subtotal from the item sum, and a missing total or tax from
+    the remaining amounts. Returns a corrected copy and the number of fixes.
+    """
+    data = data.model_copy(deep=True)
+    fixes = 0
+
+    for item in data.items:
+        if item.total_price is None and item.unit_price is not None:
+            item.total_price = round((item.quantity or 1) * item.unit_price, 2)
+            fixes += 1
+        elif item.unit_price is None and item.total_price is not None and item.quantity:
+            item.unit_price = round(item.total_price / item.quantity, 2)
+            fixes += 1
+
+    item_sum = items_total(data)
+    if data.subtotal is None and item_sum is not None:
+        data.subtotal = round(item_sum, 2)
+        fixes += 1
+
+    if data.subtotal is not None:
+        if data.total_amount is None:
+            data.total_amount = round(data.subtotal + (data.tax_amount or 0.0), 2)
+            fixes += 1
+        elif data.tax_amount is None and data.total_amount >= data.subtotal:
+            data.tax_amount = round(data.total_amount - data.subtotal, 2)
+            fixes += 1
+
+    return data, fixes
+
+def inconsistent_fields(data: ExtractedData) -> List[str]:
+    """Fields involved in any relation that doesn't add up
+
+    Checks quantity x unit_price against each line total, the item sum
+    against subtotal and subtotal + tax against total. Relations with a
+    missing number are skipped.
+    """
+    fields: List[str] = []
+
+    def flag(*names: str) -> None:
+        fields.extend(name for name in names if name not in fields)
+
+    for item in data.items:
+        if item.unit_price is not None and item.total_price is not None:
+            if not amounts_match((item.quantity or 1) * item.unit_price, item.total_price):
+                flag("items")
+
+    item_sum = items_total(data)
+    if item_sum is not None and data.subtotal is not None and not amounts_match(item_sum, data.subtotal):
+        flag("items", "subtotal")
+
+    subtotal = data.subtotal if data.subtotal is not None else item_sum
+    if subtotal is not None and data.total_amount is not None:
+        if not amounts_match(subtotal + (data.tax_amount or 0.0), data.total_amount):
+            flag("subtotal", "tax_amount", "total_amount")
+
+    return fields
+
+def totals_reconcile(data: ExtractedData) -> bool:
+    """Check that line totals, items, subtotal, tax and total add up"""
+    return not inconsistent_fields(data)
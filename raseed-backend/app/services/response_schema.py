@@ -0,0 +1,49 @@
+# app/services/response_schema.py
+from pydantic import BaseModel
+from typing import Any, Dict, Iterable, Type
+
+# Schema keywords Gemini's response_schema understands (an OpenAPI subset)
+SUPPORTED_KEYS = {"type", "format", "description", "nullable", "enum", "items", "properties", "required"}
+
+def convert_schema(schema: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert one JSON Schema node to Gemini's schema dialect
+
+    Inlines $ref, turns Optional (anyOf with null) into nullable and drops
+    keywords Gemini rejects, such as title and default.
+    """
+    if "$ref" in schema:
+        return convert_schema(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        if len(options) != 1:
+            raise ValueError("Only Optional[...] unions are supported in response schemas")
+        converted = convert_schema(options[0], defs)
+        if len(options) < len(schema["anyOf"]):
+            converted["nullable"] = True
+        if "description" in schema:
+            converted["description"] = schema["description"]
+        return converted
+
+    converted: Dict[str, Any] = {}
+    for key, value in schema.items():
+        if key not in SUPPORTED_KEYS:
+            continue
+        if key == "items":
+            value = convert_schema(value, defs)
+        elif key == "properties":
+            value = {name: convert_schema(prop, defs) for name, prop in value.items()}
+        converted[key] = value
+    return converted
+
+def gemini_schema(model: Type[BaseModel], exclude: Iterable[str] = ()) -> Dict[str, Any]:
+    """Gemini response_schema for a Pydantic model, without the excluded top-level fields"""
+    exclude = set(exclude)
+    schema = model.model_json_schema()
+    converted = convert_schema(schema, schema.get("$defs", {}))
+
+    for name in exclude:
+        converted.get("properties", {}).pop(name, None)
+    if "required" in converted:
+        converted["required"] = [name for name in converted["required"] if name not in exclude]
+    return converted
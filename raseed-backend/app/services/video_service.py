@@ -0,0 +1,125 @@
+# app/services/video_service.py
+from concurrent.futures import ProcessPoolExecutor
+import av
+import numpy as np
+import asyncio
+import heapq
+import io
+import logging
+from typing import List, Optional, Tuple, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Sharpness of a grayscale frame (variance of the 4-neighbour Laplacian)"""
+    gray = gray.astype(np.float32)
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+def text_density(gray: np.ndarray, threshold: float = 40.0) -> float:
+    """Fraction of pixels on strong horizontal edges - a cheap proxy for printed text"""
+    gradient = np.abs(np.diff(gray.astype(np.int16), axis=1))
+    return float((gradient > threshold).mean())
+
+def score_frame(gray: np.ndarray) -> float:
+    """Score a frame for extraction: sharp frames with lots of text win"""
+    return laplacian_variance(gray) * text_density(gray)
+
+def select_frames(source: Union[bytes, str], max_frames: int, sample_frames: int, analysis_width: int, max_dimension: int) -> List[bytes]:
+    """Pick the best frames of a receipt video
+
+    Runs in a worker process. source is the video bytes or the path of a
+    file holding them. Decodes keyframes only (falling back to evenly
+    spaced frames for videos with few keyframes), scores a downscaled
+    grayscale copy of each and returns up to max_frames JPEGs, best first.
+    """
+    best: List[Tuple[float, int, bytes]] = []  # min-heap of (score, index, jpeg)
+
+    def consider(frame: av.VideoFrame, index: int) -> None:
+        height = max(2, round(frame.height * analysis_width / frame.width))
+        gray = frame.reformat(width=analysis_width, height=height, format="gray").to_ndarray()
+        score = score_frame(gray)
+
+        if len(best) < max_frames or score > best[0][0]:
+            image = frame.to_image()
+            image.thumbnail((max_dimension, max_dimension))
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=settings.AI_IMAGE_QUALITY)
+
+            entry = (score, index, output.getvalue())
+            if len(best) < max_frames:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heapreplace(best, entry)
+
+    def open_video() -> av.container.InputContainer:
+        return av.open(source if isinstance(source, str) else io.BytesIO(source))
+
+    with open_video() as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = "NONKEY"
+
+        keyframes = 0
+        for frame in container.decode(stream):
+            consider(frame, keyframes)
+            keyframes += 1
+            if keyframes >= sample_frames:
+                break
+
+    if keyframes < min(3, sample_frames):
+        # Too few keyframes (common for short webm clips) - sample the full stream
+        with open_video() as container:
+            stream = container.streams.video[0]
+            total = stream.frames or int((stream.duration or 0) * (stream.time_base or 0) * (stream.average_rate or 30))
+            step = max(1, total // sample_frames) if total else 5
+
+            for index, frame in enumerate(container.decode(stream)):
+                if index % step == 0:
+                    consider(frame, keyframes + index)
+                if index >= step * sample_frames:
+                    break
+
+    return [jpeg for _, _, jpeg in sorted(best, reverse=True)]
+
+class VideoService:
+    """Video receipt frame selection running in a process pool"""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """Get (lazily create) the video worker pool"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=settings.VIDEO_WORKERS)
+        return self._executor
+
+    async def select_frames(self, source: Union[bytes, str], max_frames: Optional[int] = None) -> List[bytes]:
+        """Best frames of a video (bytes or a file path) as JPEG bytes; empty if it can't be decoded"""
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.get_executor(),
+                select_frames,
+                source,
+                max_frames or settings.VIDEO_MAX_FRAMES,
+                settings.VIDEO_SAMPLE_FRAMES,
+                settings.VIDEO_ANALYSIS_WIDTH,
+                settings.AI_IMAGE_MAX_DIMENSION
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not extract video frames: {e}")
+            return []
+
+    def shutdown(self) -> None:
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Create global instance
+video_service = VideoService()
@@ -0,0 +1,90 @@
+# benchmarks/firestore_concurrency.py
+"""
+Concurrent Firestore read throughput: sync client vs AsyncClient
+
+Simulates many request handlers reading the same receipt at once from the
+event loop. "sync" calls the blocking firestore.Client inside coroutines (the
+old ReceiptService behaviour); "async" awaits firestore.AsyncClient.
+
+Needs Firebase credentials (see README). Run from raseed-backend/:
+
+    python -m benchmarks.firestore_concurrency --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from app.core.config import settings
+from app.core.database import (
+    initialize_firebase, get_firestore_client, get_async_firestore_client
+)
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Worst delay seen by a task that wants to run every `interval` seconds"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+async def run(name: str, read: Callable[[], Awaitable[None]], requests: int, concurrency: int) -> None:
+    """Run `requests` reads with at most `concurrency` in flight and report"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            await read()
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    worst_lag = await lag_task
+
+    print(f"{name:>6}: {requests / elapsed:8.1f} req/s  {elapsed:6.2f}s total  "
+          f"max event loop lag {worst_lag * 1000:7.1f} ms")
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--receipt-id", help="receipt to read (default: newest receipt)")
+    args = parser.parse_args()
+
+    if not initialize_firebase():
+        raise SystemExit("Firebase is not configured - the benchmark needs real credentials")
+
+    db = get_firestore_client()
+    async_db = get_async_firestore_client()
+    collection = settings.FIRESTORE_COLLECTION_RECEIPTS
+
+    receipt_id = args.receipt_id
+    if not receipt_id:
+        newest = list(db.collection(collection).order_by("created_at", direction="DESCENDING").limit(1).stream())
+        if not newest:
+            raise SystemExit("No receipts found - upload one or pass --receipt-id")
+        receipt_id = newest[0].id
+
+    async def sync_read() -> None:
+        db.collection(collection).document(receipt_id).get()
+
+    async def async_read() -> None:
+        await async_db.collection(collection).document(receipt_id).get()
+
+    print(f"Reading receipt {receipt_id}: {args.requests} requests, concurrency {args.concurrency}")
+
+    # Warm up connections for both clients
+    await sync_read()
+    await async_read()
+
+    await run("sync", sync_read, args.requests, args.concurrency)
+    await run("async", async_read, args.requests, args.concurrency)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,18 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
 from app.core.database import initialize_firebase
+from app.core.http import initialize_http_client, close_http_client
+from app.core.circuit_breaker import CircuitOpenError
 from app.api.routes import receipt_router, health_router
 from app.core.logging import setup_logging
+from app.services.image_service import image_service
+from app.services.video_service import video_service
+from app.services.job_queue import processing_queue
 
 # Setup logging
 setup_logging()
@@ -16,9 +22,14 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     initialize_firebase()
+    initialize_http_client()
+    await processing_queue.start()
     yield
     # Shutdown
-    pass
+    await processing_queue.stop()
+    await close_http_client()
+    image_service.shutdown()
+    video_service.shutdown()
 
 # Create FastAPI app
 app = FastAPI(
@@ -39,6 +50,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request body limits for upload endpoints (multipart overhead included)
+UPLOAD_BODY_LIMITS = {
+    "/api/upload-receipt": settings.MAX_FILE_SIZE + 64 * 1024,
+    "/api/upload-receipts": (settings.MAX_FILE_SIZE + 64 * 1024) * settings.MAX_FILES_PER_BATCH,
+}
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject oversized uploads from Content-Length before the body is read"""
+    limit = UPLOAD_BODY_LIMITS.get(request.url.path)
+    content_length = request.headers.get("content-length")
+    
+    if limit and content_length and content_length.isdigit() and int(content_length) > limit:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"File size must be less than {settings.MAX_FILE_SIZE // (1024*1024)}MB"}
+        )
+    
+    return await call_next(request)
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """A dependency's circuit is open - tell the client when to come back"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.name} is temporarily unavailable. Please retry later."},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Include routers
 app.include_router(health_router, tags=["Health"])
 app.include_router(receipt_router, prefix="/api", tags=["Receipts"])
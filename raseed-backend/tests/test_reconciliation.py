@@ -0,0 +1,28 @@
+# tests/test_reconciliation.py
+import asyncio
+from types import SimpleNamespace
+
+from app.models.receipt import ExtractedData
+from app.services.ai_service import ai_service
+
+def reply_with(text):
+    async def generate_content(*args, **kwargs):
+        return SimpleNamespace(text=text)
+    return generate_content
+
+def test_partial_reextraction_keeps_amounts_the_model_left_out(monkeypatch):
+    monkeypatch.setattr(ai_service, "generate_content", reply_with('{"total_amount": 22.5}'))
+    data = ExtractedData(subtotal=20.0, tax_amount=2.0, total_amount=30.0, confidence_score=0.9)
+
+    corrections = asyncio.run(ai_service.reextract_fields([], data, ["subtotal", "tax_amount", "total_amount"]))
+    assert corrections == {"total_amount": 22.5}
+
+    result = asyncio.run(ai_service.reconcile_result([], data))
+    assert (result.subtotal, result.tax_amount, result.total_amount) == (20.0, 2.0, 30.0)
+
+def test_reextraction_that_reconciles_is_applied(monkeypatch):
+    monkeypatch.setattr(ai_service, "generate_content", reply_with('{"subtotal": null, "total_amount": 22.0}'))
+    data = ExtractedData(subtotal=20.0, tax_amount=2.0, total_amount=30.0, confidence_score=0.9)
+
+    result = asyncio.run(ai_service.reconcile_result([], data))
+    assert (result.subtotal, result.tax_amount, result.total_amount) == (20.0, 2.0, 22.0)
@@ -54,9 +54,15 @@ const ReceiptCard = ({ receipt }) => {
     setProcessing(true);
     try {
       console.log('🤖 Processing receipt with AI:', localReceipt.id);
-      const result = await receiptService.processReceipt(localReceipt.id);
+      // Processing is queued (202) - poll until the job finishes
+      await receiptService.processReceipt(localReceipt.id);
+      setLocalReceipt(prev => ({ ...prev, status: 'processing' }));
+
+      const result = await receiptService.waitForProcessing(localReceipt.id, {
+        onPartial: (extractedData) => setLocalReceipt(prev => ({ ...prev, extracted_data: extractedData }))
+      });
       
-      if (result.success) {
+      if (result.status === 'processed') {
         // Update local state with processed data
         setLocalReceipt(prev => ({
           ...prev,
@@ -65,6 +71,8 @@ const ReceiptCard = ({ receipt }) => {
         }));
         
         console.log('✅ AI processing successful:', result);
+      } else {
+        throw new Error(result.processing_error || 'AI processing failed');
       }
     } catch (error) {
       console.error('❌ AI processing failed:', error);
@@ -136,6 +144,17 @@ const ReceiptCard = ({ receipt }) => {
         </div>
       </div>
 
+      {/* Thumbnail - small derivative, never the full-size original */}
+      {localReceipt.file_metadata?.thumbnail_url && (
+        <img
+          src={localReceipt.file_metadata.thumbnail_url}
+          alt={getFileName()}
+          className="receipt-thumbnail"
+          loading="lazy"
+          onClick={handleView}
+        />
+      )}
+
       {/* Card Content */}
       <div className="receipt-card-content">
         {/* Amount */}
@@ -237,10 +256,17 @@ const ReceiptCard = ({ receipt }) => {
           </div>
         )}
 
+        {localReceipt.status === 'processed' && localReceipt.extracted_data?.quality_warnings?.length > 0 && (
+          <div className="processing-notice warning">
+            <AlertTriangle size={16} />
+            <span>{localReceipt.extracted_data.quality_warnings.join(' ')}</span>
+          </div>
+        )}
+
         {localReceipt.status === 'error' && (
           <div className="processing-notice error">
             <AlertTriangle size={16} />
-            <span>⚠️ Processing failed</span>
+            <span>⚠️ {localReceipt.processing_error || 'Processing failed'}</span>
             <button 
               onClick={handleProcessWithAI}
               className="retry-btn"
@@ -266,6 +292,9 @@ const ReceiptCard = ({ receipt }) => {
             {localReceipt.extracted_data && (
               <span>, Confidence: {Math.round((localReceipt.extracted_data.confidence_score || 0) * 100)}%</span>
             )}
+            {localReceipt.extracted_data?.extraction_model && (
+              <span>, Model: {localReceipt.extracted_data.extraction_model}</span>
+            )}
           </div>
         )}
       </div>
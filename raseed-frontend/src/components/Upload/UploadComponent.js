@@ -100,10 +100,15 @@ const UploadComponent = () => {
 
       console.log('✅ Upload result:', result); // Debug log
       
-      showMessage(`✅ Upload successful! Receipt ID: ${result.receipt_id}`, 'success');
-      
-      // 🔧 This should now work properly
-      addReceipt(result);
+      if (result.duplicate) {
+        // Same file was uploaded before - the backend returns the existing receipt
+        showMessage(`✅ Already uploaded! Receipt ID: ${result.receipt_id}`, 'success');
+      } else {
+        showMessage(`✅ Upload successful! Receipt ID: ${result.receipt_id}`, 'success');
+        
+        // 🔧 This should now work properly
+        addReceipt(result);
+      }
       
       // Reset form
       resetForm();
@@ -141,6 +141,7 @@ export function ReceiptProvider({ children }) {
         stored_filename: receiptData.metadata?.stored_filename,
         file_size: receiptData.metadata?.size || receiptData.metadata?.file_size,
         content_type: receiptData.metadata?.type || receiptData.metadata?.content_type,
+        thumbnail_url: receiptData.metadata?.thumbnail_url,
         upload_date: new Date().toISOString()
       },
       status: 'uploaded',
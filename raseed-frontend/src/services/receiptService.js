@@ -4,7 +4,8 @@ import ApiService from './api';
 
 export const receiptService = {
   // Upload receipt
-  async uploadReceipt(file, onProgress) {
+  // autoProcess extracts data in the same request (no second round trip)
+  async uploadReceipt(file, onProgress, autoProcess = false) {
     const formData = new FormData();
     formData.append('file', file);
 
@@ -20,7 +21,39 @@ export const receiptService = {
       }, 1000);
     }
 
-    return ApiService.post('/api/upload-receipt', formData);
+    const query = autoProcess ? '?auto_process=true' : '';
+    return ApiService.post(`/api/upload-receipt${query}`, formData);
+  },
+
+  // Upload many receipts in one request (per-file results)
+  async uploadReceipts(files) {
+    const formData = new FormData();
+    files.forEach((file) => formData.append('files', file));
+
+    return ApiService.post('/api/upload-receipts', formData);
+  },
+
+  // Upload straight to storage with a signed URL (large images/videos)
+  async uploadReceiptDirect(file) {
+    const signed = await ApiService.post('/api/upload-url', {
+      filename: file.name,
+      content_type: file.type,
+      file_size: file.size,
+    });
+
+    const response = await fetch(signed.upload_url, {
+      method: signed.method,
+      headers: signed.headers,
+      body: file,
+    });
+    if (!response.ok) {
+      throw new Error(`Storage upload failed: HTTP ${response.status}`);
+    }
+
+    return ApiService.post('/api/upload-url/finalize', {
+      stored_filename: signed.stored_filename,
+      original_filename: file.name,
+    });
   },
 
   // Get all receipts
@@ -62,7 +95,28 @@ export const receiptService = {
   async getProcessingStatus(receiptId) {
     return ApiService.get(`/api/receipts/${receiptId}/processing-status`);
   },
+
+  // Poll processing status until the queued job finishes
+  async waitForProcessing(receiptId, { interval = 2000, timeout = 120000, onPartial } = {}) {
+    const deadline = Date.now() + timeout;
+
+    while (Date.now() < deadline) {
+      const status = await this.getProcessingStatus(receiptId);
+      // 'uploaded' again means the server stopped the job before it finished
+      if (['processed', 'error', 'uploaded'].includes(status.status)) {
+        return status;
+      }
+      // Header fields and items are saved while the AI response streams in
+      if (status.partial && onPartial) {
+        onPartial(status.extracted_data);
+      }
+      await new Promise((resolve) => setTimeout(resolve, interval));
+    }
+
+    throw new Error('Processing is taking longer than expected');
+  },
 };
 
 export const uploadReceipt = receiptService.uploadReceipt;
+export const uploadReceipts = receiptService.uploadReceipts;
 export default receiptService;
\ No newline at end of file